@@ -0,0 +1,109 @@
+"""
+Account API module for provisioning accounts across a fleet of servers.
+
+This module provides functionality for:
+- Bulk account creation from the CMD_Account_Create template
+- Bulk account deactivation from the CMD_Account_Lock template
+"""
+
+import time
+from typing import Annotated
+from uuid import uuid4
+from fastapi import HTTPException, Depends
+from starlette import status
+from api.user_api import TokenDep
+from database.db import SessionDep
+from job.cmds_pool import get_cmds_all
+from job.fleet import FleetJob, get_fleet_runner, select_accounts
+from job.provision import ACCOUNT_CMDS, host_report, provision_host_handler
+from logger import get_logger
+from models.account_models import AccountProvisionRequest, AccountProvisionResult
+
+logger = get_logger("main.account_api")
+
+admin_required_exception = HTTPException(
+    status_code=status.HTTP_403_FORBIDDEN,
+    detail="only admins can provision accounts",
+)
+
+account_cmds_exception = HTTPException(
+    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+    detail="account command set is missing in cmds.yaml",
+)
+
+fleet_empty_exception = HTTPException(
+    status_code=status.HTTP_404_NOT_FOUND,
+    detail="no server matches the host selector",
+)
+
+
+async def provision_accounts(action: str, user: TokenDep, request: AccountProvisionRequest,
+                             session: SessionDep) -> AccountProvisionResult:
+    """
+    Bring accounts into the target state on every selected server of an admin.
+
+    Hosts run concurrently on the fleet runner, the accounts of one host one after
+    another. Accounts already in the target state are skipped.
+
+    Args:
+        action: create or lock
+        user: User token dependency, admins only
+        request: Accounts, host selector and sudo flag
+        session: Database session dependency
+
+    Returns:
+        AccountProvisionResult with the changed, skipped and failed accounts of every host
+
+    Raises:
+        HTTPException: If the user is not an admin, the command set is missing or no server is selected
+    """
+    if user.identity != "admin":
+        logger.error(f"Account {action} refused for {user.username}")
+        raise admin_required_exception
+
+    cmd_sets = get_cmds_all()
+    cmd_sets.refresh()
+    cmds = (cmd_sets.get_cmds() or {}).get(ACCOUNT_CMDS[action])
+    if cmds is None:
+        logger.error(f"Command set {ACCOUNT_CMDS[action]} not found")
+        raise account_cmds_exception
+
+    accounts = select_accounts(session, user.username, request.tags, request.servers)
+    if not accounts:
+        logger.error(f"No server selected for {user.username} by {request.servers} {request.tags}")
+        raise fleet_empty_exception
+
+    # the last entry of a repeated account wins
+    wanted = list({account.account: account for account in request.accounts}.values())
+    names = [account.account for account in wanted]
+    logger.info(f"Account {action} of {len(names)} accounts on {len(accounts)} servers for {user.username}")
+    batch_id = uuid4().hex
+    start = time.perf_counter()
+    handler = provision_host_handler(action, cmds, wanted, request.sudo, user.username, batch_id)
+    job = FleetJob(cmds.name, user.username, batch_id)
+    hosts = [host_report(host, names) for host in await get_fleet_runner().run_on_hosts(accounts, handler, job)]
+
+    return AccountProvisionResult(
+        batch_id=batch_id,
+        action=action,
+        hosts_total=len(hosts),
+        hosts_failed=sum(1 for host in hosts if not host.success),
+        changed=sum(len(host.changed) for host in hosts),
+        skipped=sum(len(host.skipped) for host in hosts),
+        failed=sum(len(host.failed) for host in hosts),
+        duration=round(time.perf_counter() - start, 3),
+        hosts=hosts
+    )
+
+
+async def create_accounts(user: TokenDep, request: AccountProvisionRequest, session: SessionDep):
+    return await provision_accounts("create", user, request, session)
+
+
+async def lock_accounts(user: TokenDep, request: AccountProvisionRequest, session: SessionDep):
+    return await provision_accounts("lock", user, request, session)
+
+
+# FastAPI dependencies
+AccountCreateDep = Annotated[AccountProvisionResult, Depends(create_accounts)]
+AccountLockDep = Annotated[AccountProvisionResult, Depends(lock_accounts)]
@@ -9,7 +9,7 @@ from fastapi import HTTPException, Depends
 from starlette import status
 
 from logger import get_logger
-from models.email_models import EmailConfirmResponseBase, EmailConfirmRequest, EmailSMTPRequest, TOTP
+from models.email_models import EmailConfirmResponseBase, EmailConfirmRequest, EmailSMTPRequest, get_totp
 
 logger = get_logger("main.email-api")
 
@@ -23,7 +23,7 @@ async def send_mailgun_message(email_info: EmailConfirmResponseBase):
     MAILGUN_API_KEY = os.getenv("MAILGUN_API_KEY")
     MAILGUN_DOMAIN = os.getenv("MAILGUN_DOMAIN")
     MAILGUN_API_URL = f"https://api.mailgun.net/v3/{MAILGUN_DOMAIN}/messages"
-    code = TOTP.now()
+    code = get_totp().now()
 
     request_data = EmailConfirmRequest.model_validate(
         {**email_info.model_dump(),
@@ -58,7 +58,7 @@ async def send_mailgun_message(email_info: EmailConfirmResponseBase):
 
 async def send_smtp_email(email_info: EmailConfirmResponseBase):
     """generate code"""
-    code = TOTP.now()
+    code = get_totp().now()
 
     """smtp server"""
     request_data = EmailSMTPRequest.model_validate({
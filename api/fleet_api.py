@@ -0,0 +1,174 @@
+"""
+Fleet API module for aggregates over the latest cached server snapshots.
+
+This module provides functionality for:
+- Fleet summary with percentiles per metric and idle GPUs
+- Top-N hosts, disks or GPUs by metric
+
+Nothing here opens an SSH connection, the data comes from the snapshot store fed by
+/server calls and the background poller.
+"""
+
+import heapq
+import math
+from typing import Annotated, Callable, Dict, List, Literal, Tuple
+from fastapi import Depends, HTTPException, Query
+from sqlmodel import select
+from starlette import status
+from api.user_api import TokenDep
+from database.db import SessionDep
+from job.snapshots import get_snapshot_store
+from logger import get_logger
+from models.server_models import (
+    FleetSummary,
+    FleetTop,
+    FleetTopEntry,
+    GPUEntry,
+    MetricStats,
+    ServerAccountDB,
+    ServerPublic
+)
+from ssh.gateway import Route, fleet_routes
+from ssh.ssh_manager import SSHConnectionManager, get_ssh_manager
+
+logger = get_logger("main.fleet_api")
+
+metric_exception = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail="unknown metric",
+)
+
+# metric name -> values of one snapshot as (label, value)
+MetricColumn = Callable[[ServerPublic], List[Tuple[str | None, float]]]
+FLEET_METRICS: Dict[str, MetricColumn] = {
+    "cpu_usage": lambda s: [(None, s.cpu_usage)] if s.cpu_usage is not None else [],
+    "memory_usage": lambda s: [(None, s.memory_usage)] if s.memory_usage is not None else [],
+    "disk_usage": lambda s: [(disk.mount_point, disk.usage) for disk in s.disks or []],
+    "gpu_usage": lambda s: [(str(index), gpu.usage) for index, gpu in enumerate(s.gpus or [])],
+}
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """nearest rank percentile of sorted values"""
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def metric_stats(values: List[float]) -> MetricStats:
+    if not values:
+        return MetricStats(count=0)
+    values = sorted(values)
+    return MetricStats(
+        count=len(values),
+        min=values[0],
+        max=values[-1],
+        mean=round(sum(values) / len(values), 2),
+        p50=percentile(values, 0.5),
+        p90=percentile(values, 0.9),
+        p99=percentile(values, 0.99)
+    )
+
+
+def snapshot_keys(accounts: List[ServerAccountDB], routes: Dict[Tuple[str, str], Route]) -> List[str]:
+    """snapshot keys of server accounts, an account with a broken gateway chain has none"""
+    return [SSHConnectionManager.connection_key(account.server_ip, account.account_name, account.server_port,
+                                                routes[(account.username, account.server_name)])
+            for account in accounts if (account.username, account.server_name) in routes]
+
+
+def user_snapshots(username: str, session) -> Tuple[List[ServerAccountDB], Dict[Tuple[str, str], Route],
+                                                    List[ServerPublic]]:
+    """server accounts of a user, their routes and their latest snapshots"""
+    accounts = session.exec(select(ServerAccountDB).where(ServerAccountDB.username == username)).all()
+    routes = fleet_routes(accounts)
+    return accounts, routes, list(get_snapshot_store().get_many(snapshot_keys(accounts, routes)).values())
+
+
+async def get_fleet_summary(user: TokenDep,
+                            session: SessionDep,
+                            gpu_idle_below: Annotated[float, Query(ge=0, le=100)] = 10.0) -> FleetSummary:
+    """
+    Summarize the latest snapshots of all servers of a user.
+
+    Args:
+        user: User token dependency
+        session: Database session dependency
+        gpu_idle_below: GPUs with a utilization below this percentage are listed as idle
+
+    Returns:
+        FleetSummary with count, min, max, mean and percentiles of every metric
+    """
+    accounts, routes, snapshots = user_snapshots(user.username, session)
+
+    metrics = {}
+    for name, column in FLEET_METRICS.items():
+        metrics[name] = metric_stats([value for snapshot in snapshots for _, value in column(snapshot)])
+
+    idle_gpus = [
+        GPUEntry(server_name=snapshot.server_name,
+                 server_ip=snapshot.server_ip,
+                 index=index,
+                 model=gpu.model,
+                 usage=gpu.usage)
+        for snapshot in snapshots
+        for index, gpu in enumerate(snapshot.gpus or [])
+        if gpu.usage < gpu_idle_below
+    ]
+
+    # last_updated only moves on a change, the store knows when each host was last collected
+    collected_at = get_snapshot_store().updated_at
+    updated = [collected_at[key] for key in snapshot_keys(accounts, routes) if key in collected_at]
+    return FleetSummary(
+        hosts=len(accounts),
+        reporting=len(snapshots),
+        unreachable=sum(1 for account in accounts
+                        if (account.username, account.server_name) not in routes
+                        or get_ssh_manager().is_open(account.server_ip, account.server_port,
+                                                     routes[(account.username, account.server_name)])),
+        gpus=metrics["gpu_usage"].count,
+        metrics=metrics,
+        idle_gpus=idle_gpus,
+        oldest_snapshot=min(updated) if updated else None
+    )
+
+
+async def get_fleet_top(user: TokenDep,
+                        session: SessionDep,
+                        metric: str = "memory_usage",
+                        n: Annotated[int, Query(ge=1, le=1000)] = 10,
+                        order: Literal["desc", "asc"] = "desc") -> FleetTop:
+    """
+    Top-N values of one metric over the latest snapshots of a user.
+
+    Args:
+        metric: One of cpu_usage, memory_usage, disk_usage, gpu_usage
+        n: Number of entries
+        order: desc for the highest values, asc for the lowest
+
+    Raises:
+        HTTPException: If the metric is unknown
+    """
+    column = FLEET_METRICS.get(metric)
+    if column is None:
+        logger.error(f"Unknown fleet metric {metric}")
+        raise metric_exception
+
+    _, _, snapshots = user_snapshots(user.username, session)
+    rows = ((value, snapshot, label) for snapshot in snapshots for label, value in column(snapshot))
+    pick = heapq.nlargest if order == "desc" else heapq.nsmallest
+    top = pick(n, rows, key=lambda row: row[0])
+
+    return FleetTop(
+        metric=metric,
+        order=order,
+        entries=[FleetTopEntry(server_name=snapshot.server_name,
+                               server_ip=snapshot.server_ip,
+                               label=label,
+                               value=value)
+                 for value, snapshot, label in top]
+    )
+
+
+# FastAPI dependencies
+FleetSummaryDep = Annotated[FleetSummary, Depends(get_fleet_summary)]
+FleetTopDep = Annotated[FleetTop, Depends(get_fleet_top)]
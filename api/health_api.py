@@ -0,0 +1,43 @@
+"""
+Health API module for load balancer and deploy checks.
+
+This module provides functionality for:
+- Readiness with the startup timings and the progress of the connection pre-warm
+"""
+
+from typing import Annotated
+from fastapi import Depends, Request, Response
+from starlette import status
+from job.prewarm import get_prewarmer
+from models.server_models import ReadinessStatus
+from ssh.ssh_manager import get_ssh_manager
+
+
+async def get_readiness(request: Request, response: Response) -> ReadinessStatus:
+    """
+    Readiness of the api, open to probes without a token.
+
+    The api is ready once startup is done, the pre-warm never delays it and is only
+    reported. Nothing about the servers themselves is exposed, only counts.
+
+    Args:
+        request: Request, the startup state lives on the app
+        response: Response, 503 while starting or shutting down
+
+    Returns:
+        ReadinessStatus with the startup timings and the pre-warm progress
+    """
+    ready = getattr(request.app.state, "ready", False)
+    if not ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    startup = getattr(request.app.state, "startup", None)
+    return ReadinessStatus(
+        ready=ready,
+        startup=startup.timings() if startup is not None else {},
+        connections=len(get_ssh_manager().connections),
+        prewarm=get_prewarmer().status
+    )
+
+
+# FastAPI dependencies
+ReadinessDep = Annotated[ReadinessStatus, Depends(get_readiness)]
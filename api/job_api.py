@@ -0,0 +1,104 @@
+"""
+Job API module for querying the job run history.
+
+This module provides functionality for:
+- Listing job runs with filters and pagination
+- Reading one job run with its command results
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Annotated
+from fastapi import HTTPException, Depends, Query
+from sqlmodel import select, func
+from starlette import status
+from api.user_api import TokenDep
+from database.db import SessionDep
+from job.history import get_job_recorder
+from logger import get_logger
+from models.jobs_models import JobCommandDB, JobRunDB, JobRunDetail, JobRunList
+
+logger = get_logger("main.job_api")
+
+job_not_found_exception = HTTPException(
+    status_code=status.HTTP_404_NOT_FOUND,
+    detail="job not found",
+)
+
+
+async def list_jobs(user: TokenDep,
+                    session: SessionDep,
+                    task_name: str | None = None,
+                    job_status: Annotated[str | None, Query(alias="status")] = None,
+                    server_name: str | None = None,
+                    server_ip: str | None = None,
+                    batch_id: str | None = None,
+                    since: datetime | None = None,
+                    until: datetime | None = None,
+                    limit: Annotated[int, Query(ge=1, le=500)] = 50,
+                    offset: Annotated[int, Query(ge=0)] = 0) -> JobRunList:
+    """
+    List job runs of a user, newest first.
+
+    Args:
+        user: User token dependency, admins see the runs of every user
+        session: Database session dependency
+        task_name, job_status, server_name, server_ip, batch_id: Exact match filters
+        since, until: Start time window
+        limit, offset: Pagination
+
+    Returns:
+        JobRunList with the total count of matching runs and one page of runs
+    """
+    # make sure buffered rows are visible
+    await asyncio.to_thread(get_job_recorder().flush)
+
+    filters = []
+    if user.identity != "admin":
+        filters.append(JobRunDB.username == user.username)
+    if task_name:
+        filters.append(JobRunDB.task_name == task_name)
+    if job_status:
+        filters.append(JobRunDB.status == job_status)
+    if server_name:
+        filters.append(JobRunDB.server_name == server_name)
+    if server_ip:
+        filters.append(JobRunDB.server_ip == server_ip)
+    if batch_id:
+        filters.append(JobRunDB.batch_id == batch_id)
+    if since:
+        filters.append(JobRunDB.started_at >= since)
+    if until:
+        filters.append(JobRunDB.started_at < until)
+
+    total = session.exec(select(func.count()).select_from(JobRunDB).where(*filters)).one()
+    stmt = (select(JobRunDB)
+            .where(*filters)
+            .order_by(JobRunDB.started_at.desc())
+            .offset(offset)
+            .limit(limit))
+    jobs = session.exec(stmt).all()
+    return JobRunList(total=total, limit=limit, offset=offset, jobs=jobs)
+
+
+async def get_job(job_id: str, user: TokenDep, session: SessionDep) -> JobRunDetail:
+    """
+    Get one job run with its command results.
+
+    Raises:
+        HTTPException: If the job is not found or belongs to another user
+    """
+    await asyncio.to_thread(get_job_recorder().flush)
+
+    job = session.get(JobRunDB, job_id)
+    if job is None or (user.identity != "admin" and job.username != user.username):
+        logger.error(f"Job {job_id} not found for {user.username}")
+        raise job_not_found_exception
+
+    commands = session.exec(select(JobCommandDB).where(JobCommandDB.job_id == job_id)).all()
+    return JobRunDetail(**job.model_dump(), commands=[command.model_dump() for command in commands])
+
+
+# FastAPI dependencies
+JobListDep = Annotated[JobRunList, Depends(list_jobs)]
+JobDetailDep = Annotated[JobRunDetail, Depends(get_job)]
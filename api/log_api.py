@@ -0,0 +1,144 @@
+"""
+Log API module for following remote log files.
+
+This module provides functionality for:
+- Live tail of a remote file as server-sent events, filtered on the host
+- Resuming from the byte offset of the last event received
+"""
+
+import asyncio
+from typing import Annotated, Any
+from fastapi import HTTPException, Depends, Header, Query
+from fastapi.responses import StreamingResponse
+from sqlmodel import select
+from starlette import status
+from starlette.background import BackgroundTask
+from api.user_api import TokenDep
+from database.db import SessionDep
+from job.logtail import get_log_tails
+from logger import get_logger
+from models.server_models import ServerAccountDB
+from ssh.admission import is_busy
+from ssh.deadline import request_deadline
+from ssh.gateway import resolve_route
+from ssh.ssh_manager import SSHConnectionManager, get_ssh_connection
+
+logger = get_logger("main.log_api")
+
+# comment line sent when the file is quiet, keeps proxies from closing the stream
+KEEPALIVE_SECONDS = 15
+
+log_server_exception = HTTPException(
+    status_code=status.HTTP_404_NOT_FOUND,
+    detail="server not found",
+)
+
+log_file_exception = HTTPException(
+    status_code=status.HTTP_404_NOT_FOUND,
+    detail="log file not found or not readable",
+)
+
+log_connect_exception = HTTPException(
+    status_code=status.HTTP_502_BAD_GATEWAY,
+    detail="could not connect to the server",
+)
+
+
+def sse_event(offset: int, line: str) -> str:
+    """one event, the id is the byte offset right after the line"""
+    # a carriage return would end the data field early
+    return f"id: {offset}\ndata: {line.rstrip(chr(13))}\n\n"
+
+
+async def follow_log(
+    server_name: str,
+    user: TokenDep,
+    session: SessionDep,
+    path: Annotated[str, Query(min_length=1)],
+    grep: str | None = None,
+    offset: Annotated[int | None, Query(ge=0)] = None,
+    last_event_id: Annotated[str | None, Header()] = None
+) -> StreamingResponse:
+    """
+    Follow a log file on one server of a user as server-sent events.
+
+    Viewers of the same file and filter share one remote tail. Every event carries
+    the byte offset after its line as id, a reconnecting EventSource sends it back in
+    Last-Event-ID and gets the lines written in between first.
+
+    Args:
+        server_name: Name of the server account
+        user: User token dependency
+        session: Database session dependency
+        path: Remote file to follow
+        grep: Extended regular expression, only matching lines are sent
+        offset: Byte offset to start from, the end of the file when not given
+        last_event_id: Offset of the last event received, wins over offset
+
+    Returns:
+        StreamingResponse of text/event-stream
+
+    Raises:
+        HTTPException: If the server or file is not found, or the server can't be reached
+    """
+    stmt = select(ServerAccountDB).where(ServerAccountDB.username == user.username,
+                                         ServerAccountDB.server_name == server_name)
+    account = session.exec(stmt).first()
+    if account is None:
+        logger.error(f"Server {server_name} not found for {user.username}")
+        raise log_server_exception
+    if last_event_id and last_event_id.isdigit():
+        offset = int(last_event_id)
+
+    route = await resolve_route(account)
+    try:
+        connection = await get_ssh_connection(account.server_ip, account.account_name,
+                                              account.account_password, account.server_port, route)
+    except Exception as e:
+        if is_busy(e):
+            raise
+        logger.error(f"Error connecting to {account.server_ip}: {str(e)}")
+        raise log_connect_exception
+
+    host_key = SSHConnectionManager.connection_key(account.server_ip, account.account_name, account.server_port,
+                                                   route)
+    tails = get_log_tails()
+    try:
+        tail, queue, offset = await tails.open(host_key, connection, path, grep, offset)
+    except FileNotFoundError:
+        logger.error(f"Log file {path} not readable on {account.server_ip}")
+        raise log_file_exception
+    events = tails.follow(tail, queue, offset)
+    # the stream lasts as long as the viewer stays, only opening it had to fit in the deadline
+    request_deadline.set(None)
+
+    async def sse_lines():
+        pending = asyncio.ensure_future(anext(events))
+        try:
+            while True:
+                done, _ = await asyncio.wait([pending], timeout=KEEPALIVE_SECONDS)
+                if not done:
+                    yield ": keepalive\n\n"
+                    continue
+                try:
+                    event_offset, line = pending.result()
+                except StopAsyncIteration:
+                    break
+                yield sse_event(event_offset, line)
+                pending = asyncio.ensure_future(anext(events))
+            yield "event: end\ndata: \n\n"
+        finally:
+            # the generator can only be closed once the pending read is done
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+            await events.aclose()
+
+    # a viewer hanging up before the stream starts never runs the generator, the
+    # background task still releases it
+    return StreamingResponse(sse_lines(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+                             background=BackgroundTask(tails.release, tail, queue))
+
+
+# fastapi refuses response classes as dependency types
+LogFollowDep = Annotated[Any, Depends(follow_log)]
@@ -4,30 +4,51 @@ Server API module for managing server accounts and status.
 This module provides functionality for:
 - Server status monitoring
 - Server account management
-- Password updates
+- Password updates, one server or rotated across many at once
 - Server connection testing
 """
 
+import asyncio
+import hashlib
 import io
+import json
+import time
 from datetime import datetime
-from typing import Annotated, Dict, List, Optional, Union
-from fastapi import HTTPException, Depends, status
+from typing import Annotated, Dict, Iterable, List, Optional, Set, Union
+from fastapi import HTTPException, Depends, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlmodel import select, Session
 from starlette import status
 from api.user_api import TokenDep
 from database.db import SessionDep
 from job.cmds_pool import get_cmds_all
+from job.facts import get_facts_cache
+from job.fleet import get_fleet_runner, select_accounts
+from job.snapshots import get_snapshot_store
 from logger import get_logger
 from models.server_models import (
     ServerPublic,
+    ServerFailure,
+    ServerStreamSummary,
     DiskInfo,
     GPUInfo,
     ServerAccountDB,
     ServerAccountUpdate,
     ServerPublicList,
-    ServerAccountPublic
+    ServerAccountPublic,
+    PasswordRotationRequest,
+    PasswordRotationResult
+)
+from models.tasks_models import HostTaskResult
+from ssh.admission import is_busy, ssh_priority
+from ssh.gateway import Route, check_gateway, fleet_routes, resolve_route
+from ssh.ssh_manager import (
+    SSHConnectionManager,
+    get_ssh_connection,
+    execute_commands,
+    get_ssh_manager,
+    ssh_circuit_open_exception
 )
-from ssh.ssh_manager import get_ssh_connection, execute_commands
 
 # Initialize logger
 logger = get_logger("main.server_status")
@@ -47,6 +68,11 @@ server_already_exists_exception = HTTPException(
     detail="server already exists",  # 明确提示用户已存在
 )
 
+server_gateway_in_use_exception = HTTPException(
+    status_code=status.HTTP_409_CONFLICT,
+    detail="server is the gateway of other servers",
+)
+
 account_exception = HTTPException(
     status_code=status.HTTP_401_UNAUTHORIZED,
     detail="Incorrect account name or password",
@@ -71,6 +97,28 @@ sqlite_exception = HTTPException(
     detail="sqlite error",
 )
 
+field_exception = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail="unknown server status field",
+)
+
+# status attribute -> parsed fields it is built from, see the parsers of CMD_Server_Update
+STATUS_FIELDS: Dict[str, Set[str]] = {
+    "hostname": {"hostname"},
+    "cpu": {"cpu"},
+    "cpucores": {"cpucores"},
+    "cpu_usage": {"cpu_usage"},
+    "memory_total": {"memory_total"},
+    "memory_used": {"memory_used"},
+    "memory_usage": {"memory_total", "memory_used"},
+    "disks": {"disks"},
+    "gpus": {"gpu_models", "gpu_usage"},
+}
+
+# returned with every projection, server_name comes from the cached hostname fact
+BASE_FIELDS = {"success", "server_name", "account_name", "server_ip", "server_port", "message", "last_updated", "errors",
+               "version"}
+
 def format_bytes(bytes_str: str) -> str:
     """
     Format bytes into human-readable format.
@@ -92,11 +140,76 @@ def format_bytes(bytes_str: str) -> str:
         logger.error(f"Error formatting bytes: {e}")
         return "Unknown"
 
+def split_query(value: str | None) -> List[str] | None:
+    """comma separated query parameter, None when not given"""
+    if not value:
+        return None
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+def parse_fields(fields: str | None) -> Set[str] | None:
+    """
+    Validate a field projection.
+
+    Args:
+        fields: Comma separated ServerPublic attributes or parsed metric names
+
+    Returns:
+        Set of requested fields, None for all fields
+
+    Raises:
+        HTTPException: If a field is unknown
+    """
+    requested = split_query(fields)
+    if requested is None:
+        return None
+    outputs = get_cmds_all().outputs('CMD_Server_Update')
+    unknown = set(requested) - set(STATUS_FIELDS) - BASE_FIELDS - set(outputs) - {"metrics"}
+    if unknown:
+        logger.error(f"Unknown server status fields {sorted(unknown)}")
+        raise field_exception
+    return set(requested)
+
+def status_outputs(fields: Iterable[str], outputs: Iterable[str]) -> Set[str]:
+    """parsed fields needed to build the requested status fields"""
+    outputs = set(outputs)
+    needed = {"hostname"}
+    for field in fields:
+        if field in STATUS_FIELDS:
+            needed |= STATUS_FIELDS[field]
+        elif field == "metrics":
+            needed |= outputs - set().union(*STATUS_FIELDS.values())
+        elif field in outputs:
+            needed.add(field)
+    return needed
+
+def project_status(status_data: ServerPublic, fields: Set[str]) -> ServerPublic:
+    """copy of a status with only the requested fields set"""
+    data = {name: value for name, value in status_data if name in BASE_FIELDS | fields}
+    if "metrics" not in fields and status_data.metrics:
+        data["metrics"] = {name: value for name, value in status_data.metrics.items() if name in fields} or None
+    return ServerPublic(**data)
+
+def unreachable_status(ip: str, username: str, port: int, message: str, route: Route = ()) -> ServerPublic:
+    """last known status of a host marked as failed, or an empty failed status"""
+    cached = get_snapshot_store().get(SSHConnectionManager.connection_key(ip, username, port, route))
+    if cached is not None:
+        return cached.model_copy(update={"success": False, "message": message})
+    return ServerPublic(
+        success=False,
+        server_name="unknown",
+        account_name=username,
+        server_ip=ip,
+        server_port=port,
+        message=message
+    )
+
 async def get_server_status_linux(
     ip: str,
     username: str,
     password: str,
-    port: int = 22
+    port: int = 22,
+    fields: Set[str] | None = None,
+    route: Route = ()
 ) -> ServerPublic:
     """
     Get server status information via SSH.
@@ -106,6 +219,8 @@ async def get_server_status_linux(
         username: SSH username
         password: SSH password
         port: SSH port
+        fields: Status fields to collect, only the commands they need are run. None for all
+        route: Gateways the server is reached through
         
     Returns:
         ServerPublic object containing server status information
@@ -113,8 +228,13 @@ async def get_server_status_linux(
     Raises:
         SSHConnectionException: If SSH connection fails
     """
+    if get_ssh_manager().is_open(ip, port, route):
+        # host is known to be down, answer from the cache instead of waiting for a timeout
+        cached = unreachable_status(ip, username, port, ssh_circuit_open_exception.detail, route)
+        return cached if fields is None else project_status(cached, fields)
+
     try:
-        connection = await get_ssh_connection(ip, username, password, port)
+        connection = await get_ssh_connection(ip, username, password, port, route)
         if not connection:
             # TODO :change
             logger.error(f"Cannot connect to {ip}:{port}")
@@ -128,47 +248,67 @@ async def get_server_status_linux(
         cmds = get_cmds_all()
         cmds.refresh()
         commands = cmds.get_cmds()['CMD_Server_Update']
-        results = await execute_commands(connection, commands.cmds)
+        names = set(commands.cmds) if fields is None else \
+            cmds.commands_for('CMD_Server_Update', status_outputs(fields, cmds.outputs('CMD_Server_Update')))
+
+        # static facts come from the cache, only volatile commands run on the host
+        host_key = SSHConnectionManager.connection_key(ip, username, port, route)
+        epoch = get_ssh_manager().reconnect_count(ip, username, port, route)
+        ttls = commands.ttl or {}
+        facts = get_facts_cache().get(host_key, [name for name in ttls if name in names], epoch)
+        results = await execute_commands(connection,
+                                         {name: cmd for name, cmd in commands.cmds.items()
+                                          if name in names and name not in facts},
+                                         output=commands.output,
+                                         timeouts=commands.timeout)
+        get_facts_cache().put(host_key, results, ttls, epoch)
+        results.update(facts)
+
+        # Parse with the parsers declared in cmds.yaml
+        parsed = cmds.parse('CMD_Server_Update', results)
+        values = dict(parsed.fields)
+        if parsed.errors:
+            logger.warning(f"Parse errors on {ip}: {parsed.errors}")
 
         # Process server information
-        hostname = results.get("hostname", f"server-{ip.split('.')[-1]}").stdout.strip()
-        cpu = results.get("cpu_info", "").stdout.strip()
-        cpu_usage = float(results.get("cpu_usage", "-1").stdout.strip())
-        cpucores = int(results.get("cpu_cores", "-1").stdout.strip())
+        hostname = values.pop("hostname", None) or f"server-{ip.split('.')[-1]}"
+        cpu = values.pop("cpu", None)
+        cpu_usage = values.pop("cpu_usage", None)
+        cpucores = values.pop("cpucores", None)
 
         # Process memory information
-        memory_values = results.get("memory_info", "0 0").stdout.split()
-        memory_total = format_bytes(memory_values[0]) if memory_values else "0"
-        memory_used = format_bytes(memory_values[1]) if len(memory_values) > 1 else "0"
-        memory_usage = (int(memory_values[1]) / int(memory_values[0])) * 100 if len(memory_values) >= 2 else 0.0
+        memory_total_bytes = values.pop("memory_total", None)
+        memory_used_bytes = values.pop("memory_used", None)
+        memory_total = format_bytes(memory_total_bytes) if memory_total_bytes is not None else "0"
+        memory_used = format_bytes(memory_used_bytes) if memory_used_bytes is not None else "0"
+        memory_usage = 0.0
+        if memory_total_bytes and memory_used_bytes is not None:
+            memory_usage = (memory_used_bytes / memory_total_bytes) * 100
 
         # Process disk information
-        disks = []
-        for line in results.get("disk_info", "").stdout.strip().splitlines():
-            parts = line.strip().split()
-            if len(parts) >= 4 and not any(x in parts[0] for x in ["tmpfs", "udev"]):
-                disks.append(DiskInfo(
-                    mount_point=parts[0],
-                    total=format_bytes(parts[1]),
-                    used=format_bytes(parts[2]),
-                    usage=float(parts[3].replace('%', ''))
-                ))
-
-        # Process GPU information
-        gpus = []
-        gpu_data = results.get("gpu_info", "").stdout.strip()
-        if gpu_data != "none":
-            for line in gpu_data.splitlines():
-                if ',' in line:
-                    model, usage, mem_total, mem_used = map(str.strip, line.split(','))
-                    gpus.append(GPUInfo(
-                        model=model,
-                        usage=float(usage),
-                        memory_total=f"{mem_total} MB",
-                        memory_used=f"{mem_used} MB"
-                    ))
-
-        return ServerPublic(
+        disks = [
+            DiskInfo(
+                mount_point=disk["mount_point"],
+                total=format_bytes(disk["total"]),
+                used=format_bytes(disk["used"]),
+                usage=disk["usage"]
+            )
+            for disk in values.pop("disks", [])
+        ]
+
+        # Process GPU information, models are static and joined by gpu index
+        gpu_models = {gpu["index"]: gpu["model"] for gpu in values.pop("gpu_models", [])}
+        gpus = [
+            GPUInfo(
+                model=gpu_models.get(gpu["index"], "unknown"),
+                usage=gpu["usage"],
+                memory_total=f"{gpu['memory_total']} MB",
+                memory_used=f"{gpu['memory_used']} MB"
+            )
+            for gpu in values.pop("gpu_usage", [])
+        ]
+
+        status_data = ServerPublic(
             success=True,
             server_name=hostname,
             account_name=username,
@@ -177,16 +317,32 @@ async def get_server_status_linux(
             hostname=hostname,
             cpu=cpu,
             cpucores=cpucores,
-            cpu_usage=round(cpu_usage, 1),
+            cpu_usage=round(cpu_usage, 1) if cpu_usage is not None else None,
             gpus=gpus,
             disks=disks,
             memory_total=memory_total,
             memory_used=memory_used,
             memory_usage=round(memory_usage, 1),
-            last_updated=datetime.now()
+            last_updated=datetime.now(),
+            metrics=values or None,
+            errors=parsed.errors or None
         )
+        # the stored snapshot is returned, it keeps its version when nothing changed
+        if fields is None:
+            return get_snapshot_store().update(host_key, status_data)
+
+        # a projection only refreshes its own fields of the last full snapshot
+        cached = get_snapshot_store().get(host_key)
+        if cached is None:
+            # without a full snapshot the partial status is only answered, never stored
+            return project_status(status_data, fields)
+        update = {name: getattr(status_data, name) for name in fields if name in STATUS_FIELDS}
+        status_data = cached.model_copy(update={**update, "last_updated": status_data.last_updated})
+        return project_status(get_snapshot_store().update(host_key, status_data), fields)
     except Exception as e:
         logger.error(f"Error getting server status: {e}")
+        if is_busy(e):
+            raise e
         raise ssh_exception
 
 async def update_server_password_linux(
@@ -194,7 +350,8 @@ async def update_server_password_linux(
     username: str,
     old_passwd: str,
     new_passwd: str,
-    port: int = 22
+    port: int = 22,
+    route: Route = ()
 ) -> Dict[str, str]:
     """
     Update server user password via SSH.
@@ -205,6 +362,7 @@ async def update_server_password_linux(
         old_passwd: Current password
         new_passwd: New password
         port: SSH port
+        route: Gateways the server is reached through
         
     Returns:
         Dictionary containing operation status
@@ -216,14 +374,16 @@ async def update_server_password_linux(
         cmds = get_cmds_all()
         cmds.refresh()
         commands = cmds.get_cmds()['CMD_Change_Code']
-        input_values = [locals()[v] for v in commands.sequence.values()]
+        # a comprehension has its own locals() before python 3.12
+        arguments = locals()
+        input_values = [arguments[v] for v in commands.sequence.values()]
         input_stream = io.BytesIO('\n'.join(input_values).encode('utf-8'))
 
-        connection = await get_ssh_connection(ip, username, old_passwd, port)
+        connection = await get_ssh_connection(ip, username, old_passwd, port, route)
         if not connection:
             return {"status": "password is not right in our database, please update server information by admin"}
 
-        result = await execute_commands(connection, commands.cmds, in_stream=input_stream)
+        result = await execute_commands(connection, commands.cmds, in_stream=input_stream, timeouts=commands.timeout)
         exit_code = result.get('change').exited
         stdout = result.get('change').stdout.lower()
         stderr = result['change'].stderr.lower()
@@ -239,13 +399,16 @@ async def update_server_password_linux(
     
     except Exception as e:
         logger.error(f"Error updating server password: {e}")
+        if is_busy(e):
+            raise e
         raise ssh_exception
 
 async def test_server_linux(
     ip: str,
     username: str,
     password: str,
-    port: int = 22
+    port: int = 22,
+    route: Route = ()
 ) -> Dict[str, str]:
     """
     Test server connection via SSH.
@@ -255,6 +418,7 @@ async def test_server_linux(
         username: SSH username
         password: SSH password
         port: SSH port
+        route: Gateways the server is reached through
         
     Returns:
         Dictionary containing test status
@@ -264,20 +428,121 @@ async def test_server_linux(
         cmds.refresh()
         commands = cmds.get_cmds()['CMD_Test_Server']
         
-        connection = await get_ssh_connection(ip, username, password, port)
-        
-        result = connection.run("echo 'Hello'", hide=True)
-        return {"status": "success" if "Hello" in result.stdout else "failed"}
+        connection = await get_ssh_connection(ip, username, password, port, route)
+
+        results = await execute_commands(connection, commands.cmds, timeouts=commands.timeout)
+        return {"status": "success" if all("Hello" in result.stdout for result in results.values()) else "failed"}
     except Exception as e:
         logger.error(f"Error testing server connection: {e}")
+        if is_busy(e):
+            raise e
         return {"status": "failed"}
 
+
+def user_servers(session: Session, username: str) -> Dict[str, ServerAccountDB]:
+    """server accounts of a user by server name"""
+    servers = session.exec(select(ServerAccountDB).where(ServerAccountDB.username == username)).all()
+    return {server.server_name: server for server in servers}
+
 ########################################################
 # API
 ########################################################
+async def server_account_status(account: ServerAccountDB, fields: Set[str] | None = None) -> ServerPublic:
+    """status of one server account, an unreachable host falls back to its last snapshot"""
+    route: Route = ()
+    try:
+        route = await resolve_route(account)
+        return await get_server_status_linux(
+            ip=account.server_ip,
+            username=account.account_name,
+            password=account.account_password,
+            port=account.server_port,
+            fields=fields,
+            route=route
+        )
+    except Exception as e:
+        # one broken host must not hide the others
+        status_data = unreachable_status(account.server_ip, account.account_name, account.server_port, str(e),
+                                         route)
+        return status_data if fields is None else project_status(status_data, fields)
+
+def stream_server_status(accounts: List[ServerAccountDB], fields: Set[str] | None) -> StreamingResponse:
+    """one NDJSON line per host as soon as it answers, then a summary line with the failed hosts"""
+    async def account_status(account: ServerAccountDB):
+        return account, await server_account_status(account, fields)
+
+    async def ndjson_lines():
+        start = time.perf_counter()
+        failed = []
+        # a client hanging up closes the generator, the hosts still polling are cancelled
+        jobs = [asyncio.create_task(account_status(account)) for account in accounts]
+        try:
+            for pending in asyncio.as_completed(jobs):
+                account, status_data = await pending
+                if not status_data.success:
+                    failed.append(ServerFailure(server_name=account.server_name,
+                                                server_ip=account.server_ip,
+                                                message=status_data.message))
+                yield status_data.model_dump_json() + "\n"
+        finally:
+            for job in jobs:
+                job.cancel()
+        summary = ServerStreamSummary(total=len(accounts),
+                                      succeeded=len(accounts) - len(failed),
+                                      failed=failed,
+                                      duration=round(time.perf_counter() - start, 3))
+        yield json.dumps({"summary": summary.model_dump()}) + "\n"
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+def status_etag(server_list: List[ServerPublic], *parts) -> str:
+    """
+    Weak ETag of a status list.
+
+    A stored snapshot only changes together with its version, so the version, the
+    success flag and the message of every host plus the request parts (projection,
+    since) identify the response content. The compression middleware sends the same
+    content as identity, gzip or br bodies, which differ byte for byte, so the tag is
+    weak.
+    """
+    digest = hashlib.sha1(repr(parts).encode())
+    for status_data in server_list:
+        digest.update(f"{status_data.account_name}@{status_data.server_ip}:{status_data.server_port}:"
+                      f"{status_data.version}:{status_data.success}:{status_data.message}\n".encode())
+    return f'W/"{digest.hexdigest()}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """weak comparison of If-None-Match, W/ prefixes are ignored on both sides"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag.removeprefix("W/") in [tag.strip().removeprefix("W/")
+                                                                for tag in header.split(",")]
+
+def status_delta(server_list: List[ServerPublic], keys: List[str], since: int,
+                 fields: Set[str] | None) -> List[ServerPublic]:
+    """
+    hosts changed after a version with only their changed fields, failed hosts are always
+    returned, keys are the snapshot keys of the hosts in the same order
+    """
+    delta = []
+    for status_data, key in zip(server_list, keys):
+        if not status_data.success or status_data.version is None:
+            delta.append(status_data)
+        elif status_data.version > since:
+            changed = get_snapshot_store().changed_fields(key, since)
+            delta.append(project_status(status_data, changed if fields is None else changed & fields))
+    return delta
+
 async def get_user_server_info(
     user: TokenDep,
-    session: SessionDep
+    session: SessionDep,
+    request: Request,
+    response: Response,
+    servers: str | None = None,
+    fields: str | None = None,
+    stream: bool = False,
+    since: int | None = None
 ) -> ServerPublicList:
     """
     Get all server information for a user.
@@ -285,42 +550,92 @@ async def get_user_server_info(
     Args:
         user: User token dependency
         session: Database session dependency
+        servers: Comma separated server names, all servers of the user when not given
+        fields: Comma separated status fields, all fields when not given
+        stream: Stream one NDJSON line per host as it finishes, also enabled by
+            'Accept: application/x-ndjson'
+        since: Return only the hosts and fields changed after this version
         
     Returns:
-        ServerPublicList containing all server information
+        ServerPublicList containing all server information, or a StreamingResponse when streaming.
+        A 304 response when If-None-Match matches the ETag of the result
         
     Raises:
         ServerAccountException: If no server accounts found
         ServerNotFoundException: If no servers found
     """
+    projection = parse_fields(fields)
+    server_names = split_query(servers)
     try:
         stmt = select(ServerAccountDB).where(ServerAccountDB.username == user.username)
+        if server_names is not None:
+            stmt = stmt.where(ServerAccountDB.server_name.in_(server_names))
         accounts = session.exec(stmt).all()
 
         if not accounts:
             logger.error(f"User server info not found for {user.username}")
             raise account_exception
 
-        server_list = []
-        for account in accounts:
-            status_data = await get_server_status_linux(
-                ip=account.server_ip,
-                username=account.account_name,
-                password=account.account_password,
-                port=account.server_port
-            )
-            server_list.append(status_data)
+        if stream or "application/x-ndjson" in request.headers.get("accept", ""):
+            return stream_server_status(accounts, projection)
+
+        server_list = list(await asyncio.gather(*(server_account_status(account, projection)
+                                                  for account in accounts)))
 
         if not server_list:
             logger.error(f"No servers found for {user.username}")
             raise server_exception()
 
-        return ServerPublicList(servers=server_list)
+        etag = status_etag(server_list, sorted(projection or []), since)
+        if etag_matches(request, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+
+        version = max((status_data.version for status_data in server_list if status_data.version), default=None)
+        if since is not None:
+            # a failed host is returned whole, a broken gateway chain needs no key
+            routes = fleet_routes(list(user_servers(session, user.username).values()))
+            keys = [SSHConnectionManager.connection_key(account.server_ip, account.account_name, account.server_port,
+                                                        routes.get((account.username, account.server_name), ()))
+                    for account in accounts]
+            server_list = status_delta(server_list, keys, since, projection)
+        return ServerPublicList(servers=server_list, version=version)
     
     except Exception as e:
         logger.error(f"Error getting user server info: {e}")
 
 
+async def get_user_server(
+    server_name: str,
+    user: TokenDep,
+    session: SessionDep,
+    fields: str | None = None
+) -> ServerPublic:
+    """
+    Get the status of one server of a user.
+
+    Args:
+        server_name: Name of the server account
+        user: User token dependency
+        session: Database session dependency
+        fields: Comma separated status fields, all fields when not given
+
+    Returns:
+        ServerPublic of the server
+
+    Raises:
+        HTTPException: If the server is not found or a field is unknown
+    """
+    projection = parse_fields(fields)
+    stmt = select(ServerAccountDB).where(ServerAccountDB.username == user.username,
+                                         ServerAccountDB.server_name == server_name)
+    account = session.exec(stmt).first()
+    if account is None:
+        logger.error(f"Server {server_name} not found for {user.username}")
+        raise server_exception
+    return await server_account_status(account, projection)
+
+
 async def update_user_server_info(user: TokenDep, server_new: ServerAccountUpdate, session: SessionDep):
     """
     Update user's server information including password change.
@@ -345,6 +660,9 @@ async def update_user_server_info(user: TokenDep, server_new: ServerAccountUpdat
         logger.error(f"Password change rejected for {user.username}: Password too short")
         raise passwdnot_exception
 
+    if server_new.gateway is not None:
+        check_gateway(user_servers(session, user.username), server_new.server_name, server_new.gateway)
+
     try:
         # Find existing server account
         stmt = select(ServerAccountDB).where(
@@ -364,7 +682,8 @@ async def update_user_server_info(user: TokenDep, server_new: ServerAccountUpdat
             username=existing_server.account_name,
             old_passwd=existing_server.account_password,
             new_passwd=server_new.account_password_new,
-            port=existing_server.server_port
+            port=existing_server.server_port,
+            route=await resolve_route(existing_server)
         )
 
         if ssh_result['status'] != "success":
@@ -394,7 +713,9 @@ async def update_user_server_info(user: TokenDep, server_new: ServerAccountUpdat
         session.rollback()
         
         # Handle specific error types
-        if "SSH" in str(e) or "Connection" in str(e):
+        if is_busy(e):
+            raise e
+        elif "SSH" in str(e) or "Connection" in str(e):
             raise ssh_exception
         elif "database" in str(e) or "sql" in str(e):
             raise sqlite_exception
@@ -402,6 +723,94 @@ async def update_user_server_info(user: TokenDep, server_new: ServerAccountUpdat
             raise server_account_exception
 
 
+async def rotate_user_server_passwords(user: TokenDep, request: PasswordRotationRequest,
+                                      session: SessionDep) -> PasswordRotationResult:
+    """
+    Change the password of many server accounts of a user at once.
+
+    passwd runs on every selected server concurrently, each success is committed on
+    its own right away, so the database never holds an old password for a rotated
+    host even when other hosts fail. Hosts already on the new password are skipped.
+
+    Args:
+        user: User token dependency
+        request: New password and host selector
+        session: Database session dependency
+
+    Returns:
+        PasswordRotationResult with the outcome of every host and the servers to retry
+
+    Raises:
+        HTTPException: If the password is too short or no server is selected
+    """
+    if len(request.account_password_new) < 8:
+        logger.error(f"Password rotation rejected for {user.username}: Password too short")
+        raise passwdnot_exception
+
+    accounts = select_accounts(session, user.username, request.tags, request.servers)
+    if not accounts:
+        logger.error(f"No server selected for {user.username} by {request.servers} {request.tags}")
+        raise server_exception
+    by_name = {account.server_name: account for account in accounts}
+    start = time.perf_counter()
+
+    async def rotate(account: ServerAccountDB) -> HostTaskResult:
+        host = HostTaskResult(server_name=account.server_name,
+                              server_ip=account.server_ip,
+                              server_port=account.server_port,
+                              success=True,
+                              message="skipped")
+        if account.account_password == request.account_password_new:
+            return host
+        token = ssh_priority.set("task")
+        try:
+            ssh_result = await update_server_password_linux(
+                ip=account.server_ip,
+                username=account.account_name,
+                old_passwd=account.account_password,
+                new_passwd=request.account_password_new,
+                port=account.server_port,
+                route=await resolve_route(account)
+            )
+        finally:
+            ssh_priority.reset(token)
+        host.success = ssh_result["status"] == "success"
+        host.message = ssh_result["status"]
+        return host
+
+    hosts = []
+    async for host in get_fleet_runner().iter_hosts(accounts, rotate):
+        if host.success and host.message == "success":
+            account = by_name[host.server_name]
+            account.account_password = request.account_password_new
+            try:
+                session.add(account)
+                session.commit()
+                logger.info(f"Rotated password of {account.account_name}@{account.server_ip} for {user.username}")
+            except Exception as e:
+                # the other hosts are still rotating, one failed commit must not cancel them
+                session.rollback()
+                logger.error(f"Password of {account.account_name}@{account.server_ip} rotated on the server "
+                             f"but not saved for {user.username}: {e}")
+                host.success = False
+                host.message = "database error"
+        elif not host.success:
+            logger.error(f"Password rotation failed on {host.server_ip} for {user.username}: {host.message}")
+        hosts.append(host)
+
+    skipped = sum(1 for host in hosts if host.message == "skipped")
+    retry_servers = [host.server_name for host in hosts if not host.success]
+    return PasswordRotationResult(
+        total=len(hosts),
+        succeeded=len(hosts) - skipped - len(retry_servers),
+        skipped=skipped,
+        failed=len(retry_servers),
+        duration=round(time.perf_counter() - start, 3),
+        hosts=hosts,
+        retry_servers=retry_servers
+    )
+
+
 async def create_user_server(user: TokenDep, server: ServerAccountDB, session: SessionDep):
     """
     Create a new server account for a user.
@@ -417,6 +826,9 @@ async def create_user_server(user: TokenDep, server: ServerAccountDB, session: S
     Raises:
         HTTPException: Various exceptions for different error cases
     """
+    # hosts behind a login node are tested through it
+    route = check_gateway(user_servers(session, user.username), server.server_name, server.gateway)
+
     try:
         # Check if server already exists
         stmt = select(ServerAccountDB).where(
@@ -435,7 +847,8 @@ async def create_user_server(user: TokenDep, server: ServerAccountDB, session: S
             server.server_ip,
             server.account_name,
             server.account_password,
-            port=server.server_port
+            port=server.server_port,
+            route=route
         )
         
         if result['status'] != "success":
@@ -455,7 +868,9 @@ async def create_user_server(user: TokenDep, server: ServerAccountDB, session: S
         logger.error(f"Error in create_user_server for user {user.username}: {str(e)}")
         
         # Handle specific error types
-        if "already exists" in str(e):
+        if is_busy(e):
+            raise e
+        elif "already exists" in str(e):
             raise server_already_exists_exception
         elif "SSH" in str(e) or "Connection" in str(e):
             raise ssh_exception
@@ -473,15 +888,24 @@ async def del_user_server(user: TokenDep, server: ServerAccountPublic, session:
     if existing_server is None:
         logger.error(f"server is not found for  existing")
         raise server_exception
-    else:
-        session.delete(existing_server)
-        session.commit()
-        logger.info(f"Successfully deleted server account for user {user.username}")
-        return server
+    # the servers behind it would lose their route, they have to move first
+    dependents = session.exec(select(ServerAccountDB.server_name).where(
+        ServerAccountDB.username == user.username,
+        ServerAccountDB.gateway == existing_server.server_name
+    )).all()
+    if dependents:
+        logger.error(f"Server {existing_server.server_name} of {user.username} is the gateway of {dependents}")
+        raise server_gateway_in_use_exception
+    session.delete(existing_server)
+    session.commit()
+    logger.info(f"Successfully deleted server account for user {user.username}")
+    return server
 
 
 # FastAPI dependencies
 ServerDep = Annotated[ServerPublicList, Depends(get_user_server_info)]
+ServerOneDep = Annotated[ServerPublic, Depends(get_user_server)]
 ServerAccountUpdater = Annotated[ServerAccountPublic, Depends(update_user_server_info)]
+ServerPasswordRotator = Annotated[PasswordRotationResult, Depends(rotate_user_server_passwords)]
 ServerAccountCreater = Annotated[ServerAccountPublic, Depends(create_user_server)]
 ServerAccountdel = Annotated[ServerAccountPublic, Depends(del_user_server)]
@@ -0,0 +1,281 @@
+"""
+Server import API module for moving server accounts in and out in bulk.
+
+This module provides functionality for:
+- CSV / JSONL import with concurrent connection tests and one insert transaction
+- Streamed CSV / JSONL export of the server accounts of a user
+"""
+
+import asyncio
+import csv
+import io
+import json
+import time
+from typing import Annotated, Any, Dict, Iterator, List, Literal, Set, Tuple
+from fastapi import HTTPException, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlmodel import Session, select
+from starlette import status
+from api.server_api import test_server_linux
+from api.user_api import TokenDep
+from database.db import SessionDep, get_engine
+from envset.config import get_config
+from logger import get_logger
+from models.server_models import ServerAccountDB, ServerAccountPublic, ServerImportError, ServerImportResult
+from ssh.admission import is_busy
+from ssh.gateway import Route, check_gateway
+
+logger = get_logger("main.server_import")
+
+# rows accepted in one import
+IMPORT_ROW_LIMIT = 10000
+# rows added per flush and fetched per query batch on export
+BATCH_SIZE = 500
+
+EXPORT_COLUMNS = ["server_name", "account_name", "server_ip", "server_port", "tags", "gateway"]
+
+import_format_exception = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail="import body is not valid csv or jsonl",
+)
+
+import_size_exception = HTTPException(
+    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+    detail=f"import is limited to {IMPORT_ROW_LIMIT} rows",
+)
+
+
+def import_format(request: Request, file_format: str | None) -> str:
+    """explicit ?format=, otherwise the content type, csv by default"""
+    if file_format:
+        return file_format
+    content_type = request.headers.get("content-type", "")
+    return "jsonl" if "json" in content_type else "csv"
+
+
+def parse_rows(body: str, file_format: str) -> List[Tuple[int, Dict[str, Any] | None, str | None]]:
+    """(row number, row, parse error) of every data row"""
+    if file_format == "csv":
+        reader = csv.DictReader(io.StringIO(body))
+        if not reader.fieldnames:
+            raise import_format_exception
+        # empty cells fall back to the model defaults
+        return [(number, {key: value for key, value in row.items() if key and value not in (None, "")}, None)
+                for number, row in enumerate(reader, start=1)]
+
+    rows = []
+    for number, line in enumerate((line for line in body.splitlines() if line.strip()), start=1):
+        try:
+            row = json.loads(line)
+            rows.append((number, row, None) if isinstance(row, dict) else (number, None, "row is not an object"))
+        except json.JSONDecodeError as e:
+            rows.append((number, None, f"invalid json: {e.msg}"))
+    return rows
+
+
+def validation_message(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors())
+
+
+async def import_servers(
+    user: TokenDep,
+    session: SessionDep,
+    request: Request,
+    file_format: Annotated[Literal["csv", "jsonl"] | None, Query(alias="format")] = None,
+    test: bool = True
+) -> ServerImportResult:
+    """
+    Import server accounts of a user from a CSV or JSONL body.
+
+    Columns are server_name, account_name, server_ip, server_port, account_password, tags
+    and gateway. Rows are validated, checked against the existing servers and each other,
+    and the connection of every remaining row is tested concurrently under the fleet
+    concurrency cap. A gateway can be an existing server or another row, rows behind a
+    gateway are tested through it. The rows that pass are inserted in one transaction, every other
+    row is reported with the reason.
+
+    Args:
+        user: User token dependency
+        session: Database session dependency
+        request: Raw request, the body is the file
+        file_format: csv or jsonl, taken from the content type when not given
+        test: Test the ssh connection of every row before inserting it
+
+    Returns:
+        ServerImportResult with the imported count and the per-row errors
+
+    Raises:
+        HTTPException: If the body can't be parsed or has too many rows
+    """
+    start = time.perf_counter()
+    try:
+        body = (await request.body()).decode("utf-8-sig")
+        rows = parse_rows(body, import_format(request, file_format))
+    except (UnicodeDecodeError, csv.Error):
+        raise import_format_exception
+    if len(rows) > IMPORT_ROW_LIMIT:
+        raise import_size_exception
+
+    existing = session.exec(select(ServerAccountDB).where(ServerAccountDB.username == user.username)).all()
+    names = {server.server_name for server in existing}
+    addresses = {(server.server_ip, server.server_port) for server in existing}
+
+    errors: List[ServerImportError] = []
+    candidates: List[Tuple[int, ServerAccountDB]] = []
+    for number, row, error in rows:
+        if error is not None:
+            errors.append(ServerImportError(row=number, message=error))
+            continue
+        try:
+            server = ServerAccountPublic.model_validate({**row, "username": user.username})
+        except ValidationError as e:
+            errors.append(ServerImportError(row=number, server_name=row.get("server_name"),
+                                            message=validation_message(e)))
+            continue
+        if not server.server_name:
+            errors.append(ServerImportError(row=number, message="server_name is missing"))
+            continue
+        if server.server_name in names or (server.server_ip, server.server_port) in addresses:
+            errors.append(ServerImportError(row=number, server_name=server.server_name,
+                                            message="server already exists"))
+            continue
+        names.add(server.server_name)
+        addresses.add((server.server_ip, server.server_port))
+        candidates.append((number, ServerAccountDB(**server.model_dump())))
+
+    # gateways may name existing servers or other rows of the import
+    servers = {server.server_name: server for server in existing}
+    servers.update((server.server_name, server) for _, server in candidates)
+    routes: Dict[str, Route] = {}
+    checked = []
+    for number, server in candidates:
+        try:
+            routes[server.server_name] = check_gateway(servers, server.server_name, server.gateway)
+            checked.append((number, server))
+        except HTTPException as e:
+            errors.append(ServerImportError(row=number, server_name=server.server_name, message=e.detail))
+    candidates = checked
+
+    if test and candidates:
+        semaphore = asyncio.Semaphore(get_config().job.max_concurrency)
+
+        async def test_row(server: ServerAccountDB) -> str | None:
+            async with semaphore:
+                try:
+                    result = await test_server_linux(server.server_ip, server.account_name,
+                                                     server.account_password, port=server.server_port,
+                                                     route=routes[server.server_name])
+                except Exception as e:
+                    return e.detail if is_busy(e) else str(e)
+            return None if result["status"] == "success" else "connection test failed"
+
+        failures = await asyncio.gather(*(test_row(server) for _, server in candidates))
+        passed = []
+        for (number, server), failure in zip(candidates, failures):
+            if failure is None:
+                passed.append((number, server))
+            else:
+                errors.append(ServerImportError(row=number, server_name=server.server_name, message=failure))
+        # rows behind a row that failed its test would point at a gateway never created
+        candidates = drop_orphans(passed, {server.server_name for server in existing}, errors)
+
+    # one transaction, flushed in batches to keep the unit of work small
+    try:
+        for offset in range(0, len(candidates), BATCH_SIZE):
+            session.add_all([server for _, server in candidates[offset:offset + BATCH_SIZE]])
+            session.flush()
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Server import failed for {user.username}: {str(e)}")
+        errors.extend(ServerImportError(row=number, server_name=server.server_name, message="database error")
+                      for number, server in candidates)
+        candidates = []
+
+    errors.sort(key=lambda error: error.row)
+    logger.info(f"Imported {len(candidates)} of {len(rows)} servers for {user.username}")
+    return ServerImportResult(
+        total=len(rows),
+        imported=len(candidates),
+        failed=len(errors),
+        duration=round(time.perf_counter() - start, 3),
+        errors=errors
+    )
+
+
+def drop_orphans(candidates: List[Tuple[int, ServerAccountDB]], existing: Set[str],
+                 errors: List[ServerImportError]) -> List[Tuple[int, ServerAccountDB]]:
+    """
+    rows whose gateway is neither an existing server nor a row still imported are
+    reported and dropped, until every gateway left is created
+    """
+    while True:
+        kept = existing | {server.server_name for _, server in candidates}
+        orphans = [(number, server) for number, server in candidates
+                   if server.gateway is not None and server.gateway not in kept]
+        if not orphans:
+            return candidates
+        for number, server in orphans:
+            errors.append(ServerImportError(row=number, server_name=server.server_name,
+                                            message=f"gateway {server.gateway} was not imported"))
+        candidates = [candidate for candidate in candidates if candidate not in orphans]
+
+
+def export_lines(username: str, file_format: str, passwords: bool) -> Iterator[str]:
+    """rows of a user in batches, runs in the threadpool with its own session"""
+    columns = EXPORT_COLUMNS + (["account_password"] if passwords else [])
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+    if file_format == "csv":
+        writer.writeheader()
+
+    stmt = (select(ServerAccountDB)
+            .where(ServerAccountDB.username == username)
+            .order_by(ServerAccountDB.server_name)
+            .execution_options(yield_per=BATCH_SIZE))
+    with Session(get_engine()) as session:
+        for batch in session.exec(stmt).partitions():
+            for server in batch:
+                row = {column: getattr(server, column) for column in columns}
+                if file_format == "csv":
+                    writer.writerow(row)
+                else:
+                    buffer.write(json.dumps(row, ensure_ascii=False) + "\n")
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+async def export_servers(
+    user: TokenDep,
+    file_format: Annotated[Literal["csv", "jsonl"], Query(alias="format")] = "csv",
+    passwords: bool = False
+) -> StreamingResponse:
+    """
+    Stream the server accounts of a user as CSV or JSONL.
+
+    Rows are read in batches, the export never holds the whole table in memory.
+    Passwords are only included when asked for, the import needs them, so only an
+    export with passwords=true can be imported again.
+
+    Args:
+        user: User token dependency
+        file_format: csv or jsonl
+        passwords: Include the account passwords
+
+    Returns:
+        StreamingResponse of the rows
+    """
+    logger.info(f"Exporting servers of {user.username} as {file_format}, passwords: {passwords}")
+    media_type = "text/csv" if file_format == "csv" else "application/x-ndjson"
+    return StreamingResponse(export_lines(user.username, file_format, passwords), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="servers.{file_format}"'})
+
+
+# FastAPI dependencies
+ServerImportDep = Annotated[ServerImportResult, Depends(import_servers)]
+# fastapi refuses response classes as dependency types
+ServerExportDep = Annotated[Any, Depends(export_servers)]
@@ -0,0 +1,169 @@
+"""
+Task API module for running tasks across a fleet of servers.
+
+This module provides functionality for:
+- Host selection by server name, tag or all servers of a user
+- Concurrent task execution with aggregated or streamed per-host results
+- Batch command execution, command sets or ad-hoc commands, optionally with sudo
+"""
+
+import json
+import time
+from typing import Annotated, List
+from uuid import uuid4
+from fastapi import HTTPException, Depends
+from fastapi.responses import StreamingResponse
+from starlette import status
+from api.user_api import TokenDep
+from database.db import SessionDep
+from job.cmds_pool import get_cmds_all
+from job.fleet import (FleetJob, HostHandler, command_host_handler, get_fleet_runner, select_accounts,
+                       task_host_handler)
+from job.task_pool import get_tasks_all
+from logger import get_logger
+from models.server_models import ServerAccountDB
+from models.tasks_models import FleetCommandRequest, FleetTaskRequest, FleetTaskResult, HostTaskResult
+
+logger = get_logger("main.task_api")
+
+task_not_found_exception = HTTPException(
+    status_code=status.HTTP_404_NOT_FOUND,
+    detail="task not found",
+)
+
+fleet_empty_exception = HTTPException(
+    status_code=status.HTTP_404_NOT_FOUND,
+    detail="no server matches the host selector",
+)
+
+cmds_not_found_exception = HTTPException(
+    status_code=status.HTTP_404_NOT_FOUND,
+    detail="command set not found",
+)
+
+adhoc_forbidden_exception = HTTPException(
+    status_code=status.HTTP_403_FORBIDDEN,
+    detail="only admins can run ad-hoc commands",
+)
+
+# task name of ad-hoc commands in the results and the job history
+ADHOC_NAME = "adhoc"
+
+
+def summarize_hosts(task_name: str, hosts: List[HostTaskResult], duration: float,
+                    batch_id: str | None = None) -> FleetTaskResult:
+    succeeded = sum(1 for host in hosts if host.success)
+    return FleetTaskResult(
+        batch_id=batch_id,
+        task_name=task_name,
+        total=len(hosts),
+        succeeded=succeeded,
+        failed=len(hosts) - succeeded,
+        duration=round(duration, 3),
+        hosts=hosts
+    )
+
+
+async def run_fleet_task(user: TokenDep, request: FleetTaskRequest, session: SessionDep, stream: bool = False):
+    """
+    Run a task on every selected server of a user concurrently.
+
+    Args:
+        user: User token dependency
+        request: Task name and host selector
+        session: Database session dependency
+        stream: Stream one NDJSON line per host as it finishes, then a summary line
+
+    Returns:
+        FleetTaskResult, or a StreamingResponse when stream is set
+
+    Raises:
+        HTTPException: If the task or the selected servers are not found
+    """
+    tasks = get_tasks_all().get_task() or {}
+    if request.task_name not in tasks:
+        logger.error(f"Task {request.task_name} not found for {user.username}")
+        raise task_not_found_exception
+
+    accounts = select_accounts(session, user.username, request.tags, request.servers)
+    if not accounts:
+        logger.error(f"No server selected for {user.username} by {request}")
+        raise fleet_empty_exception
+
+    logger.info(f"Running task '{request.task_name}' on {len(accounts)} servers for {user.username}")
+    batch_id = uuid4().hex
+    handler = task_host_handler(request.task_name, user.username, batch_id)
+    return await run_on_fleet(FleetJob(request.task_name, user.username, batch_id), accounts, handler, stream)
+
+
+async def run_fleet_command(user: TokenDep, request: FleetCommandRequest, session: SessionDep, stream: bool = False):
+    """
+    Run a command set of cmds.yaml, or one ad-hoc command, on every selected server of a user.
+
+    Args:
+        user: User token dependency, only admins may run ad-hoc commands
+        request: Command set name or command, sudo flag and host selector
+        session: Database session dependency
+        stream: Stream one NDJSON line per host as it finishes, then a summary line
+
+    Returns:
+        FleetTaskResult, or a StreamingResponse when stream is set
+
+    Raises:
+        HTTPException: If the command set or the selected servers are not found,
+            or a user who is not an admin sends an ad-hoc command
+    """
+    if request.command is not None:
+        if user.identity != "admin":
+            logger.error(f"Ad-hoc command refused for {user.username}")
+            raise adhoc_forbidden_exception
+        name, commands, output, timeouts = ADHOC_NAME, {"command": request.command}, None, None
+    else:
+        cmd_sets = get_cmds_all()
+        cmd_sets.refresh()
+        cmds = (cmd_sets.get_cmds() or {}).get(request.cmds_name)
+        if cmds is None:
+            logger.error(f"Command set {request.cmds_name} not found for {user.username}")
+            raise cmds_not_found_exception
+        name, commands, output, timeouts = request.cmds_name, cmds.cmds, cmds.output, cmds.timeout
+
+    if request.timeout is not None:
+        timeouts = {command_name: request.timeout for command_name in commands}
+
+    accounts = select_accounts(session, user.username, request.tags, request.servers)
+    if not accounts:
+        logger.error(f"No server selected for {user.username} by {request}")
+        raise fleet_empty_exception
+
+    # ad-hoc commands are logged in full for the audit trail
+    logger.info(f"Running {'sudo ' if request.sudo else ''}command '{request.command or name}' "
+                f"on {len(accounts)} servers for {user.username}")
+    batch_id = uuid4().hex
+    handler = command_host_handler(name, commands, request.sudo, output, timeouts, user.username, batch_id)
+    return await run_on_fleet(FleetJob(name, user.username, batch_id), accounts, handler, stream)
+
+
+async def run_on_fleet(job: FleetJob, accounts: List[ServerAccountDB], handler: HostHandler, stream: bool):
+    """run a host handler on the fleet runner, aggregated or as NDJSON lines"""
+    name, batch_id = job.name, job.batch_id
+    runner = get_fleet_runner()
+    start = time.perf_counter()
+
+    if stream:
+        async def ndjson_lines():
+            hosts = []
+            async for host in runner.iter_hosts(accounts, handler, job):
+                hosts.append(host)
+                yield host.model_dump_json() + "\n"
+            summary = summarize_hosts(name, hosts, time.perf_counter() - start, batch_id)
+            yield json.dumps({"summary": summary.model_dump(exclude={"hosts"})}) + "\n"
+
+        return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+    hosts = await runner.run_on_hosts(accounts, handler, job)
+    return summarize_hosts(name, hosts, time.perf_counter() - start, batch_id)
+
+
+# FastAPI dependencies
+FleetTaskDep = Annotated[FleetTaskResult, Depends(run_fleet_task)]
+FleetCommandDep = Annotated[FleetTaskResult, Depends(run_fleet_command)]
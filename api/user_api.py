@@ -16,7 +16,7 @@ from database.db import SessionDep, get_session
 from envset.config import get_config
 from logger import get_logger
 from models.auth import ACCESS_TOKEN_EXPIRE_MINUTES, Token, oauth2_scheme, SECRET_KEY, ALGORITHM, TokenData
-from models.email_models import TOTP
+from models.email_models import get_totp
 from models.user_models import UserCreate, UserInDB, UserUpdate, UserPublic
 
 logger = get_logger("main.user_api")
@@ -111,7 +111,7 @@ async def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db:
 
 
 async def create_user(user: UserCreate, session: SessionDep):
-    if TOTP.verify(user.verify_code, valid_window=30):
+    if get_totp().verify(user.verify_code, valid_window=30):
 
         user_past = await get_user(user.username, session)
 
@@ -0,0 +1,86 @@
+"""Serialization and compression cost of the /server payload per host.
+
+Usage (from the repository root):
+    python -m benchmarks.serialization --hosts 500 --gpus 8 --disks 6
+"""
+
+import argparse
+import gzip
+import time
+from datetime import datetime
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from models.server_models import DiskInfo, GPUInfo, ServerPublic, ServerPublicList
+from utils.responses import ModelResponse
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def make_payload(hosts: int, gpus: int, disks: int) -> ServerPublicList:
+    return ServerPublicList(servers=[
+        ServerPublic(
+            success=True,
+            server_name=f"node{i}",
+            account_name="user",
+            server_ip=f"10.0.{i // 250}.{i % 250}",
+            hostname=f"node{i}",
+            cpu="Intel(R) Xeon(R) Gold 6248R CPU @ 3.00GHz",
+            cpucores=96,
+            cpu_usage=12.5,
+            memory_total="503.8 GB",
+            memory_used="120.1 GB",
+            memory_usage=23.8,
+            gpus=[GPUInfo(model="NVIDIA GeForce RTX 3090", usage=50.0, memory_total="24576 MB",
+                          memory_used="1000 MB") for _ in range(gpus)],
+            disks=[DiskInfo(mount_point=f"/data{d}", total="7.3 TB", used="1.1 TB", usage=15.0) for d in range(disks)],
+            last_updated=datetime.now(),
+            version=i
+        )
+        for i in range(hosts)
+    ])
+
+
+def timed(name: str, func, hosts: int, rounds: int):
+    func()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = func()
+    seconds = (time.perf_counter() - start) / rounds
+    print(f"{name:42s} {seconds * 1000:8.2f} ms {seconds / hosts * 1e6:8.1f} us/host")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hosts", type=int, default=500)
+    parser.add_argument("--gpus", type=int, default=8)
+    parser.add_argument("--disks", type=int, default=6)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    payload = make_payload(args.hosts, args.gpus, args.disks)
+    hosts, rounds = args.hosts, args.rounds
+
+    print(f"{hosts} hosts, {args.gpus} gpus, {args.disks} disks per host")
+    timed("jsonable_encoder + JSONResponse (old)", lambda: JSONResponse(jsonable_encoder(payload)).body, hosts, rounds)
+    timed("jsonable_encoder + ORJSONResponse", lambda: ORJSONResponse(jsonable_encoder(payload)).body, hosts, rounds)
+    body = timed("ModelResponse", lambda: ModelResponse(payload).body, hosts, rounds)
+
+    print(f"\nbody {len(body) / 1024:.1f} KiB")
+    for level in (1, 6, 9):
+        compressed = timed(f"gzip level {level}", lambda: gzip.compress(body, level), hosts, rounds)
+        print(f"{'':42s} {len(compressed) / 1024:8.1f} KiB")
+    if brotli is None:
+        print("brotli not installed, skipped")
+        return
+    for quality in (1, 4, 11):
+        compressed = timed(f"brotli quality {quality}", lambda: brotli.compress(body, quality=quality), hosts,
+                           1 if quality > 9 else rounds)
+        print(f"{'':42s} {len(compressed) / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""Throughput and poll cost of the ssh transport profiles against a local mock server.
+
+The mock server is a paramiko server in a child process, so the CPU time measured is the
+one of the client alone. --latency and --bandwidth put an emulated link in front of it,
+on plain loopback compression and window sizes can't pay off. Every profile opens one
+connection, runs a command printing --bulk MiB of log lines and then --polls status
+commands of a few KiB, the size of a CMD_Server_Update run.
+
+Usage (from the repository root):
+    python -m benchmarks.ssh_transport --latency 40 --bandwidth 50 --bulk 16 --polls 50
+    python -m benchmarks.ssh_transport --config   # the profiles of config.yaml instead
+"""
+
+import argparse
+import io
+import logging
+import multiprocessing
+import queue
+import socket
+import threading
+import time
+from typing import Dict
+import paramiko
+from fabric import Connection
+from models.config_models import TransportProfile
+from ssh.output import BoundedRemote
+from ssh.transport import profile_kwargs
+
+PROFILES: Dict[str, TransportProfile | None] = {
+    "paramiko defaults": None,
+    "compress": TransportProfile(compress=True),
+    "aes128-gcm": TransportProfile(ciphers=["aes128-gcm@openssh.com"]),
+    "wide window": TransportProfile(window_size=16 * 1024 * 1024),
+    "wan": TransportProfile(compress=True, ciphers=["aes128-gcm@openssh.com"], window_size=16 * 1024 * 1024),
+}
+
+LOG_LINE = "2024-05-01T12:00:{:02d} node{:03d} kernel: [{:>12.6f}] nvidia-nvswitch: link {} state ACTIVE\n"
+
+
+def log_lines(size: int) -> bytes:
+    """compressible text like the output of a log tail"""
+    lines = []
+    total = 0
+    i = 0
+    while total < size:
+        line = LOG_LINE.format(i % 60, i % 997, i * 0.137, i % 18)
+        lines.append(line)
+        total += len(line)
+        i += 1
+    return "".join(lines).encode()[:size]
+
+
+POLL_OUTPUT = log_lines(6 * 1024)
+
+
+class MockServer(paramiko.ServerInterface):
+    """password auth, exec answers "bulk <bytes>" and "poll" without a shell"""
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_env_request(self, channel, name, value):
+        return True
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=answer, args=(channel, command.decode()), daemon=True).start()
+        return True
+
+
+def answer(channel: paramiko.Channel, command: str):
+    words = command.split()
+    if words[:1] == ["bulk"]:
+        remaining = int(words[1])
+        chunk = log_lines(65536)
+        while remaining > 0:
+            channel.sendall(chunk[:remaining])
+            remaining -= len(chunk)
+    else:
+        channel.sendall(POLL_OUTPUT)
+    channel.shutdown_write()
+    channel.send_exit_status(0)
+
+
+def pipe(source: socket.socket, target: socket.socket, latency: float, bandwidth: float):
+    """one direction of the emulated link, every chunk is delayed and paced"""
+    chunks: queue.Queue = queue.Queue()
+
+    def read():
+        data = b"x"
+        while data:
+            try:
+                data = source.recv(65536)
+            except OSError:
+                data = b""
+            chunks.put((time.monotonic() + latency, data))
+
+    threading.Thread(target=read, daemon=True).start()
+    try:
+        while True:
+            due, data = chunks.get()
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            if not data:
+                target.shutdown(socket.SHUT_WR)
+                return
+            target.sendall(data)
+            if bandwidth:
+                time.sleep(len(data) / bandwidth)
+    except OSError:
+        # the other side hung up
+        return
+
+
+def serve(ready, latency: float, bandwidth: float):
+    # clients hanging up after their run are not worth a traceback
+    logging.getLogger("paramiko").setLevel(logging.CRITICAL)
+    host_key = paramiko.RSAKey.generate(2048)
+    server = socket.create_server(("127.0.0.1", 0))
+    link = socket.create_server(("127.0.0.1", 0))
+
+    def handle(client: socket.socket):
+        transport = paramiko.Transport(client)
+        transport.add_server_key(host_key)
+        transport.use_compression(True)
+        transport.start_server(server=MockServer())
+
+    def accept_server():
+        while True:
+            client, _ = server.accept()
+            threading.Thread(target=handle, args=(client,), daemon=True).start()
+
+    def accept_link():
+        while True:
+            client, _ = link.accept()
+            upstream = socket.create_connection(server.getsockname())
+            for source, target in ((client, upstream), (upstream, client)):
+                threading.Thread(target=pipe, args=(source, target, latency, bandwidth), daemon=True).start()
+
+    threading.Thread(target=accept_server, daemon=True).start()
+    threading.Thread(target=accept_link, daemon=True).start()
+    ready.put(link.getsockname()[1] if latency or bandwidth else server.getsockname()[1])
+    threading.Event().wait()
+
+
+def run_profile(name: str, profile: TransportProfile | None, port: int, bulk: int, polls: int):
+    start = time.perf_counter()
+    connection = Connection(host="127.0.0.1", port=port, user="bench",
+                            connect_kwargs={"password": "bench", "look_for_keys": False,
+                                            "allow_agent": False, **profile_kwargs(profile)})
+    connection.config.runners.remote = BoundedRemote
+    connection.open()
+    connect = time.perf_counter() - start
+
+    start = time.perf_counter()
+    # the stdin of the commands is empty, like in execute_commands
+    connection.run(f"bulk {bulk}", hide=True, in_stream=io.StringIO())
+    throughput = bulk / (time.perf_counter() - start) / 1024 / 1024
+
+    connection.run("poll", hide=True, in_stream=io.StringIO())
+    cpu = time.process_time()
+    start = time.perf_counter()
+    for _ in range(polls):
+        connection.run("poll", hide=True, in_stream=io.StringIO())
+    wall = (time.perf_counter() - start) / polls
+    cpu = (time.process_time() - cpu) / polls
+    connection.close()
+    print(f"{name:20s} {connect * 1000:9.1f} ms {throughput:9.1f} MiB/s {wall * 1000:9.1f} ms {cpu * 1000:9.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0, help="one way delay of the link in ms")
+    parser.add_argument("--bandwidth", type=float, default=0, help="link speed in Mbit/s, 0 for unlimited")
+    parser.add_argument("--bulk", type=float, default=16, help="MiB printed by the bulk command")
+    parser.add_argument("--polls", type=int, default=50)
+    parser.add_argument("--config", action="store_true", help="compare the profiles of config.yaml")
+    args = parser.parse_args()
+
+    profiles = PROFILES
+    if args.config:
+        from envset.config import get_config
+        profiles = {"paramiko defaults": None, **get_config().ssh.transport_profiles}
+
+    ready = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(ready, args.latency / 1000, args.bandwidth * 1e6 / 8),
+                                     daemon=True)
+    server.start()
+    port = ready.get(timeout=30)
+
+    print(f"link: {args.latency} ms one way, {args.bandwidth or 'unlimited'} Mbit/s, "
+          f"bulk {args.bulk} MiB, {args.polls} polls")
+    print(f"{'profile':20s} {'connect':>12s} {'bulk':>15s} {'poll wall':>12s} {'poll cpu':>12s}")
+    for name, profile in profiles.items():
+        run_profile(name, profile, port, int(args.bulk * 1024 * 1024), args.polls)
+    server.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,45 @@
 from typing import Annotated
 from fastapi import Depends
+from sqlalchemy import Engine, inspect, text
 from sqlmodel import SQLModel, create_engine, Session
 from envset.config import get_config
 
-config = get_config()
+# built from the settings on first use
+ENGINE: Engine | None = None
 
-# read in settings
-sqlite_file_name = config.database.path + config.database.name + ".db"
 
-engine = create_engine(url=f"sqlite:///{sqlite_file_name}",
-                       connect_args={"check_same_thread": config.database.thread})
+def get_engine() -> Engine:
+    global ENGINE
+    if ENGINE is None:
+        config = get_config()
+        # read in settings
+        sqlite_file_name = config.database.path + config.database.name + ".db"
+        ENGINE = create_engine(url=f"sqlite:///{sqlite_file_name}",
+                               connect_args={"check_same_thread": config.database.thread})
+    return ENGINE
 
 
 def get_session():
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         yield session
 
 
 def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+    SQLModel.metadata.create_all(get_engine())
+    add_missing_columns()
+
+
+def add_missing_columns():
+    """add nullable columns introduced after a table was first created"""
+    engine = get_engine()
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
 
 
 SessionDep = Annotated[Session, Depends(get_session)]
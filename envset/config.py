@@ -7,13 +7,15 @@ logger = get_logger("main.settings")
 
 
 class ConfigCreate:
+    """config.yaml, read on the first get_config"""
 
     def __init__(self):
         super().__init__()
         self.config = None
-        self.read()
+        self.loaded = False
 
     def read(self):
+        self.loaded = True
         try:
             with open("config.yaml", "r") as file:
                 self.config = Config(**yaml.safe_load(file))
@@ -26,6 +28,8 @@ class ConfigCreate:
             logger.error(e)
 
     def get_config(self):
+        if not self.loaded:
+            self.read()
         if self.config is None:
             logger.error("config file not found")
         return self.config
@@ -5,7 +5,6 @@ from dotenv import load_dotenv
 from logger import get_logger
 
 logger = get_logger("env logger")
-load_dotenv(".env")  # laod env file
 
 
 class EnvSet:
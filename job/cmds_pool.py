@@ -1,5 +1,8 @@
+import os
+import re
+from typing import Dict, Iterable, Set
 import yaml
-from pydantic import ValidationError
+from job.parsers import Parser, ParseResult, compile_parser, parse_results
 from logger import get_logger
 from models.tasks_models import CMDS
 from utils import format_object_for_log
@@ -10,22 +13,50 @@ logger = get_logger("main.cmds")
 class CmdsCreate:
     def __init__(self, cmds_path):
         self.cmds = {}
+        self.parsers = {}
         self.cmds_path = cmds_path
+        self.mtime = None
         self.refresh()
 
     def refresh(self):
-        try:
-            with open(self.cmds_path, "r", encoding="utf-8") as file:
-                buffer = yaml.safe_load(file)
-                for cmds_key in buffer:
-                    cmds = buffer[cmds_key]
-                    if cmds['activate']:
-                        self.cmds[cmds_key] = CMDS(**cmds)
-                        # output command info
-                        logger.info(format_object_for_log(self.cmds[cmds_key]))
-        except ValidationError as e:
-            logger.error(e)
+        """reload cmds.yaml when it changed, output parsers are compiled once per load"""
+        mtime = os.path.getmtime(self.cmds_path)
+        if mtime == self.mtime:
+            return
 
+        with open(self.cmds_path, "r", encoding="utf-8") as file:
+            buffer = yaml.safe_load(file)
+        cmds_all, parsers_all = {}, {}
+        for cmds_key in buffer:
+            cmds = buffer[cmds_key]
+            try:
+                if cmds['activate']:
+                    cmds_all[cmds_key] = CMDS(name=cmds_key, **cmds)
+                    parsers_all[cmds_key] = {name: compile_parser(name, spec)
+                                             for name, spec in (cmds_all[cmds_key].parsers or {}).items()}
+                    # output command info
+                    logger.info(format_object_for_log(cmds_all[cmds_key]))
+            except (ValueError, re.error) as e:
+                logger.error(f"Command set {cmds_key} is invalid: {e}")
+                cmds_all.pop(cmds_key, None)
+
+        self.cmds, self.parsers, self.mtime = cmds_all, parsers_all, mtime
+
+    def get_parsers(self, cmds_key) -> Dict[str, Parser]:
+        return self.parsers.get(cmds_key, {})
+
+    def outputs(self, cmds_key) -> Dict[str, str]:
+        """parsed field name -> command producing it"""
+        return {field: name for name, parser in self.get_parsers(cmds_key).items() for field in parser.outputs()}
+
+    def commands_for(self, cmds_key, fields: Iterable[str]) -> Set[str]:
+        """names of the commands needed to produce the given parsed fields"""
+        outputs = self.outputs(cmds_key)
+        return {outputs[field] for field in fields if field in outputs}
+
+    def parse(self, cmds_key, results) -> ParseResult:
+        """parse execute_commands results with the parsers of a command set"""
+        return parse_results(self.get_parsers(cmds_key), results)
 
     def get_cmds(self):
         if len(self.cmds) == 0:
@@ -35,9 +66,13 @@ class CmdsCreate:
             return self.cmds
 
 
-CMDS_READER = CmdsCreate("cmds.yaml")
+# cmds.yaml is read on first use
+CMDS_READER: CmdsCreate | None = None
 
 
 def get_cmds_all():
+    global CMDS_READER
+    if CMDS_READER is None:
+        CMDS_READER = CmdsCreate("cmds.yaml")
     CMDS_READER.get_cmds()
     return CMDS_READER
\ No newline at end of file
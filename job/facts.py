@@ -0,0 +1,108 @@
+"""Host facts cache for static command output, persisted in sqlite across restarts."""
+
+import threading
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Dict
+from sqlmodel import Session, select
+from database.db import get_engine
+from logger import get_logger
+from models.server_models import HostFactDB
+
+logger = get_logger("main.facts")
+
+
+def fact_result(fact: HostFactDB) -> SimpleNamespace:
+    """cached fact shaped like a Result of execute_commands"""
+    return SimpleNamespace(
+        stdout=fact.stdout,
+        stderr="",
+        exited=0,
+        ok=True,
+        failed=False,
+        command=fact.command,
+        duration=0.0,
+        cached=True
+    )
+
+
+class HostFactsCache:
+    """static facts of each host, refreshed on expiry or after a reconnection"""
+
+    def __init__(self):
+        self.facts: Dict[str, Dict[str, HostFactDB]] = {}
+        # reconnect count of the connection the facts were read through
+        self.epochs: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def load(self, host_key: str, epoch: int) -> Dict[str, HostFactDB]:
+        """facts of a host, read from sqlite on first use"""
+        if host_key not in self.facts:
+            with Session(get_engine()) as session:
+                rows = session.exec(select(HostFactDB).where(HostFactDB.host_key == host_key)).all()
+            with self.lock:
+                self.facts[host_key] = {row.name: row for row in rows}
+                self.epochs[host_key] = epoch
+        return self.facts[host_key]
+
+    def get(self, host_key: str, names, epoch: int) -> Dict[str, SimpleNamespace]:
+        """
+        Valid cached facts of a host.
+
+        Args:
+            host_key: ssh connection key of the host
+            names: command names classified as static
+            epoch: current reconnect count of the connection
+
+        Returns:
+            Dict[str, SimpleNamespace]: cached results, keyed by command name
+        """
+        facts = self.load(host_key, epoch)
+        if self.epochs.get(host_key) != epoch:
+            logger.info(f"Connection to {host_key} was re-established, refreshing host facts")
+            with self.lock:
+                facts.clear()
+                self.epochs[host_key] = epoch
+            return {}
+
+        now = datetime.now()
+        return {name: fact_result(facts[name]) for name in names
+                if name in facts and facts[name].expires_at > now}
+
+    def put(self, host_key: str, results: Dict, ttls: Dict[str, int], epoch: int):
+        """store the successful results of static commands"""
+        now = datetime.now()
+        rows = [
+            HostFactDB(host_key=host_key,
+                       name=name,
+                       command=result.command,
+                       stdout=result.stdout,
+                       fetched_at=now,
+                       expires_at=now + timedelta(seconds=ttls[name]))
+            for name, result in results.items()
+            if name in ttls and result.ok and not getattr(result, "cached", False)
+        ]
+        if not rows:
+            return
+
+        with self.lock:
+            facts = self.facts.setdefault(host_key, {})
+            for row in rows:
+                facts[row.name] = row
+            self.epochs[host_key] = epoch
+
+        try:
+            with Session(get_engine()) as session:
+                for row in rows:
+                    session.merge(row)
+                session.commit()
+        except Exception as e:
+            logger.error(f"Error saving host facts of {host_key}: {str(e)}")
+
+
+# create one host facts cache
+FACTS_CACHE = HostFactsCache()
+
+
+def get_facts_cache() -> HostFactsCache:
+    return FACTS_CACHE
@@ -0,0 +1,244 @@
+"""Fleet execution module for running one job on many hosts concurrently."""
+
+import asyncio
+import re
+import shlex
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, List
+from fabric import Connection, Result
+from invoke import FailingResponder
+from sqlmodel import select, Session
+from envset.config import get_config
+from job.history import get_job_recorder
+from job.scheduler import dispatch_task, to_command_results
+from logger import get_logger
+from models.server_models import ServerAccountDB
+from models.tasks_models import HostTaskResult
+from ssh.admission import ssh_priority
+from ssh.gateway import resolve_route
+from ssh.ssh_manager import execute_commands, get_ssh_connection
+
+logger = get_logger("main.fleet")
+
+HostHandler = Callable[[ServerAccountDB], Awaitable[HostTaskResult]]
+
+
+@dataclass
+class FleetJob:
+    """job history entry of a fleet run, hosts whose handler raises are recorded under it"""
+    name: str
+    username: str | None = None
+    batch_id: str | None = None
+
+# sudo password prompt, unlikely to show up in the output of a command
+SUDO_PROMPT = "[sudo] password for last: "
+
+
+def account_tags(account: ServerAccountDB) -> List[str]:
+    """split the comma separated tags column"""
+    if not account.tags:
+        return []
+    return [tag.strip() for tag in account.tags.split(",") if tag.strip()]
+
+
+def select_accounts(session: Session,
+                    username: str,
+                    tags: List[str] | None = None,
+                    servers: List[str] | None = None) -> List[ServerAccountDB]:
+    """
+    Select server accounts of a user by host selector.
+
+    Args:
+        session: Database session
+        username: Owner of the server accounts
+        tags: Keep servers carrying at least one of these tags
+        servers: Keep servers with these server names
+
+    Returns:
+        List of matching ServerAccountDB rows, all servers of the user when no selector is given
+    """
+    stmt = select(ServerAccountDB).where(ServerAccountDB.username == username)
+    if servers:
+        stmt = stmt.where(ServerAccountDB.server_name.in_(servers))
+    accounts = session.exec(stmt).all()
+
+    if tags:
+        wanted = set(tags)
+        accounts = [account for account in accounts if wanted.intersection(account_tags(account))]
+    return list(accounts)
+
+
+class FleetRunner:
+    """run host handlers under a global and a per-host semaphore"""
+
+    def __init__(self, max_concurrency: int, per_host_concurrency: int):
+        self.global_semaphore = asyncio.Semaphore(max_concurrency)
+        self.per_host_concurrency = per_host_concurrency
+        self.host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def host_semaphore(self, ip: str, port: int) -> asyncio.Semaphore:
+        host_key = f"{ip}:{port}"
+        if host_key not in self.host_semaphores:
+            self.host_semaphores[host_key] = asyncio.Semaphore(self.per_host_concurrency)
+        return self.host_semaphores[host_key]
+
+    async def run_on_host(self, account: ServerAccountDB, handler: HostHandler,
+                          job: FleetJob | None = None) -> HostTaskResult:
+        """run handler for one host, never raise so one host can't break the fleet"""
+        started_at = datetime.now()
+        start = time.perf_counter()
+        try:
+            async with self.global_semaphore, self.host_semaphore(account.server_ip, account.server_port):
+                result = await handler(account)
+        except Exception as e:
+            logger.error(f"Fleet job failed on {account.server_ip}:{account.server_port}: {str(e)}")
+            result = HostTaskResult(
+                server_name=account.server_name,
+                server_ip=account.server_ip,
+                server_port=account.server_port,
+                success=False,
+                message=str(e)
+            )
+            # the handler never got to record the run, connection failures and shed work included
+            if job is not None:
+                result.duration = round(time.perf_counter() - start, 3)
+                result.job_id = get_job_recorder().record(job.name, result, started_at, job.username, job.batch_id)
+        # handlers may time themselves, otherwise include the time spent waiting
+        result.duration = result.duration or round(time.perf_counter() - start, 3)
+        return result
+
+    async def iter_hosts(self, accounts: List[ServerAccountDB], handler: HostHandler,
+                         job: FleetJob | None = None) -> AsyncIterator[HostTaskResult]:
+        """yield each host result the moment it is ready"""
+        tasks = [asyncio.create_task(self.run_on_host(account, handler, job)) for account in accounts]
+        try:
+            for pending in asyncio.as_completed(tasks):
+                yield await pending
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def run_on_hosts(self, accounts: List[ServerAccountDB], handler: HostHandler,
+                           job: FleetJob | None = None) -> List[HostTaskResult]:
+        """run handler on all hosts and keep the order of accounts"""
+        return list(await asyncio.gather(*(self.run_on_host(account, handler, job) for account in accounts)))
+
+
+def task_host_handler(task_name: str, username: str | None = None, batch_id: str | None = None) -> HostHandler:
+    """build a host handler running a tasks.yaml task and recording it in the job history"""
+
+    async def handler(account: ServerAccountDB) -> HostTaskResult:
+        started_at = datetime.now()
+        start = time.perf_counter()
+        token = ssh_priority.set("task")
+        try:
+            results = await dispatch_task(task_name,
+                                          account.server_ip,
+                                          account.server_port,
+                                          account.account_name,
+                                          account.account_password,
+                                          await resolve_route(account))
+        finally:
+            ssh_priority.reset(token)
+        success = bool(results) and all(
+            step_results and all(result.ok for result in step_results.values())
+            for step_results in results.values()
+        )
+        host = HostTaskResult(
+            server_name=account.server_name,
+            server_ip=account.server_ip,
+            server_port=account.server_port,
+            success=success,
+            duration=round(time.perf_counter() - start, 3),
+            results=results
+        )
+        host.job_id = get_job_recorder().record(task_name, host, started_at, username, batch_id)
+        return host
+
+    return handler
+
+
+def sudo_command(command: str) -> str:
+    """run a shell command through sudo, the password is read from stdin"""
+    return f"sudo -S -p {shlex.quote(SUDO_PROMPT)} sh -c {shlex.quote(command)}"
+
+
+async def run_commands(connection: Connection,
+                       account: ServerAccountDB,
+                       commands: Dict[str, str],
+                       sudo: bool = False,
+                       output: Dict[str, int] | None = None,
+                       timeouts: Dict[str, float] | None = None) -> Dict[str, Result]:
+    """run commands one by one, through sudo answering the prompt with the account password"""
+    results = {}
+    for command_name, command in commands.items():
+        watchers = None
+        if sudo:
+            command = sudo_command(command)
+            # responders keep their position in the output, one per command
+            watchers = [FailingResponder(pattern=re.escape(SUDO_PROMPT),
+                                         response=f"{account.account_password}\n",
+                                         sentinel="Sorry, try again.")]
+        results.update(await execute_commands(connection, {command_name: command},
+                                              output=output, watchers=watchers, timeouts=timeouts))
+    return results
+
+
+def command_host_handler(name: str,
+                         commands: Dict[str, str],
+                         sudo: bool = False,
+                         output: Dict[str, int] | None = None,
+                         timeouts: Dict[str, float] | None = None,
+                         username: str | None = None,
+                         batch_id: str | None = None) -> HostHandler:
+    """
+    Build a host handler running a batch of commands and recording it in the job history.
+
+    Args:
+        name: Name of the batch, used as step and task name in the results and the history
+        commands: Commands to run in order, {command name: command}
+        sudo: Run every command through sudo, answering the prompt with the account password
+        output: Characters of output kept per command name
+        timeouts: Seconds per command name
+        username: User that started the run
+        batch_id: Id shared by the hosts of one fleet run
+    """
+
+    async def handler(account: ServerAccountDB) -> HostTaskResult:
+        started_at = datetime.now()
+        start = time.perf_counter()
+        token = ssh_priority.set("task")
+        try:
+            connection = await get_ssh_connection(account.server_ip, account.account_name,
+                                                  account.account_password, account.server_port,
+                                                  await resolve_route(account))
+            results = await run_commands(connection, account, commands, sudo, output, timeouts)
+        finally:
+            ssh_priority.reset(token)
+        command_results = to_command_results(results)
+        host = HostTaskResult(
+            server_name=account.server_name,
+            server_ip=account.server_ip,
+            server_port=account.server_port,
+            success=bool(command_results) and all(result.ok for result in command_results.values()),
+            duration=round(time.perf_counter() - start, 3),
+            results={name: command_results}
+        )
+        host.job_id = get_job_recorder().record(name, host, started_at, username, batch_id)
+        return host
+
+    return handler
+
+
+# create one fleet runner, on first use
+FLEET_RUNNER: FleetRunner | None = None
+
+
+def get_fleet_runner() -> FleetRunner:
+    global FLEET_RUNNER
+    if FLEET_RUNNER is None:
+        config = get_config()
+        FLEET_RUNNER = FleetRunner(config.job.max_concurrency, config.job.per_host_concurrency)
+    return FLEET_RUNNER
@@ -0,0 +1,172 @@
+"""Job history module for persisting job runs and command results with batched writes."""
+
+import asyncio
+import threading
+from datetime import datetime, timedelta
+from typing import List
+from sqlmodel import Session, delete, select
+from database.db import get_engine
+from envset.config import get_config
+from logger import get_logger
+from models.jobs_models import JobCommandDB, JobRunDB
+from models.tasks_models import CommandResult, HostTaskResult
+
+logger = get_logger("main.job_history")
+
+
+def truncate_output(text: str, limit: int) -> str:
+    """keep the head and the tail of long command output"""
+    if text is None or len(text) <= limit:
+        return text or ""
+    half = limit // 2
+    return f"{text[:half]}\n...[{len(text) - 2 * half} chars truncated]...\n{text[-half:]}"
+
+
+class JobRecorder:
+    """buffer job rows in memory and write them to sqlite in batches"""
+
+    def __init__(self, batch_size: int, output_limit: int, retention_days: int, buffer_limit: int):
+        self.batch_size = batch_size
+        self.output_limit = output_limit
+        self.retention_days = retention_days
+        self.buffer_limit = buffer_limit
+        self.buffer: List[JobRunDB | JobCommandDB] = []
+        self.lock = threading.Lock()
+        # held from taking the buffer to its commit, record only waits for lock
+        self.flush_lock = threading.Lock()
+
+    def record(self,
+               task_name: str,
+               host: HostTaskResult,
+               started_at: datetime,
+               username: str | None = None,
+               batch_id: str | None = None) -> str:
+        """
+        Queue one job run with its command results.
+
+        Args:
+            task_name: Name of the task that ran
+            host: Per-host task result
+            started_at: Start time of the run
+            username: User that started the run
+            batch_id: Id shared by the hosts of one fleet run
+
+        Returns:
+            str: id of the job run
+        """
+        run = JobRunDB(
+            batch_id=batch_id,
+            task_name=task_name,
+            username=username,
+            server_name=host.server_name,
+            server_ip=host.server_ip,
+            server_port=host.server_port,
+            status="success" if host.success else "failed",
+            message=host.message,
+            started_at=started_at,
+            finished_at=started_at + timedelta(seconds=host.duration),
+            duration=host.duration
+        )
+        rows: List[JobRunDB | JobCommandDB] = [run]
+        for step, results in host.results.items():
+            rows.extend(self.command_row(run.id, step, name, result, host)
+                        for name, result in results.items())
+
+        with self.lock:
+            self.buffer.extend(rows)
+            full = len(self.buffer) >= self.batch_size
+        if full:
+            self.flush_soon()
+        return run.id
+
+    def flush_soon(self):
+        """flush in the default executor when called from the event loop, sqlite io blocks"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        loop.run_in_executor(None, self.flush)
+
+    def command_row(self, job_id: str, step: str, name: str, result: CommandResult, host: HostTaskResult):
+        return JobCommandDB(
+            job_id=job_id,
+            step=step,
+            command_name=name,
+            command=result.command,
+            host=f"{host.server_ip}:{host.server_port}",
+            exit_code=result.exit_code,
+            ok=result.ok,
+            stdout=truncate_output(result.stdout, self.output_limit),
+            stderr=truncate_output(result.stderr, self.output_limit),
+            duration=result.duration
+        )
+
+    def flush(self):
+        """
+        write every buffered row in one transaction, a flush returns only once the rows
+        buffered before it are committed or back in the buffer
+        """
+        with self.flush_lock:
+            with self.lock:
+                rows, self.buffer = self.buffer, []
+            if not rows:
+                return
+            try:
+                with Session(get_engine()) as session:
+                    session.add_all(rows)
+                    session.commit()
+                logger.debug(f"Flushed {len(rows)} job history rows")
+            except Exception as e:
+                logger.error(f"Error flushing job history, keeping {len(rows)} rows for the next flush: {str(e)}")
+                self.requeue(rows)
+
+    def requeue(self, rows: List[JobRunDB | JobCommandDB]):
+        """put rows of a failed flush back in front, the oldest runs go past the buffer limit"""
+        with self.lock:
+            self.buffer[:0] = rows
+            dropped = max(len(self.buffer) - self.buffer_limit, 0)
+            # never keep the command rows of a dropped run
+            while dropped < len(self.buffer) and isinstance(self.buffer[dropped], JobCommandDB):
+                dropped += 1
+            del self.buffer[:dropped]
+        if dropped:
+            logger.error(f"Job history buffer is full, dropped the {dropped} oldest rows")
+
+    def prune(self):
+        """delete job runs older than the retention window"""
+        cutoff = datetime.now() - timedelta(days=self.retention_days)
+        try:
+            with Session(get_engine()) as session:
+                expired = select(JobRunDB.id).where(JobRunDB.started_at < cutoff)
+                session.exec(delete(JobCommandDB).where(JobCommandDB.job_id.in_(expired)))
+                pruned = session.exec(delete(JobRunDB).where(JobRunDB.started_at < cutoff)).rowcount
+                session.commit()
+            if pruned:
+                logger.info(f"Pruned {pruned} job runs older than {self.retention_days} days")
+        except Exception as e:
+            logger.error(f"Error pruning job history: {str(e)}")
+
+
+# create one job recorder, on first use
+JOB_RECORDER: JobRecorder | None = None
+
+
+def get_job_recorder() -> JobRecorder:
+    global JOB_RECORDER
+    if JOB_RECORDER is None:
+        config = get_config()
+        JOB_RECORDER = JobRecorder(config.job.history_batch_size,
+                                   config.job.history_output_limit,
+                                   config.job.history_retention_days,
+                                   config.job.history_buffer_limit)
+    return JOB_RECORDER
+
+
+def schedule_history_jobs(scheduler):
+    """flush buffered rows periodically and prune expired runs"""
+    recorder = get_job_recorder()
+    scheduler.add_job(recorder.flush, "interval",
+                      seconds=get_config().job.history_flush_interval, id="job_history_flush", replace_existing=True)
+    scheduler.add_job(recorder.prune, "interval",
+                      hours=1, id="job_history_prune", replace_existing=True, next_run_time=datetime.now())
@@ -0,0 +1,233 @@
+"""Shared remote log tails with byte offset cursors.
+
+One remote `tail -F` per (host, path, grep) is shared by every viewer. Filtering runs
+on the host, grep -b prints each matching line with its byte offset, so only matching
+lines cross the wire and a viewer can resume from the offset after the last line it
+has seen. Recent matches are kept in a small buffer for viewers joining late, older
+ranges are read once with a separate bounded command.
+"""
+
+import asyncio
+import shlex
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Set, Tuple
+from fabric import Connection
+from logger import get_logger
+from ssh.deadline import request_deadline
+from ssh.output import CommandStream
+from ssh.ssh_manager import execute_commands, get_ssh_manager
+
+logger = get_logger("main.logtail")
+
+# matching lines kept for late viewers
+RECENT_LINES = 1000
+# lines queued per viewer before a slow viewer is dropped, it resumes from its cursor
+VIEWER_QUEUE = 1000
+
+# offset after a line and the line
+Event = Tuple[int, str]
+
+
+def filter_command(source: str, grep: str | None) -> str:
+    """
+    pipe a byte stream through the remote filter, grep prints the offset of each
+    matching line in the stream, awk and friends would wait for a full input buffer
+    """
+    return f"{source} | LC_ALL=C grep --line-buffered -b -E -e {shlex.quote(grep or '')}"
+
+
+async def iter_events(connection: Connection, command: str, start: int) -> AsyncIterator[Event]:
+    """(offset, line) events printed by the remote filter of a stream starting at byte start"""
+    partial = ""
+    async with CommandStream(connection, command, combine_stderr=False) as stream:
+        # opening the channel takes an admission slot, reading a long running tail doesn't hold one
+        async with get_ssh_manager().admission.slot():
+            await asyncio.to_thread(stream.open)
+        async for chunk in stream:
+            lines = (partial + chunk).split("\n")
+            partial = lines.pop()
+            for line in lines:
+                offset, _, text = line.partition(":")
+                if offset.isdigit():
+                    yield start + int(offset) + len(text.encode()) + 1, text
+
+
+class LogTail:
+    """one remote tail -F feeding every subscribed viewer"""
+
+    def __init__(self, key: Tuple[str, str, str], connection: Connection, path: str, grep: str | None, start: int):
+        self.key = key
+        self.connection = connection
+        self.path = path
+        self.grep = grep
+        self.start = start
+        # everything after covered_from is in recent
+        self.covered_from = start
+        self.recent: Deque[Event] = deque()
+        self.viewers: Set[asyncio.Queue] = set()
+        self.task: asyncio.Task | None = None
+
+    def command(self) -> str:
+        # the shell waits for the channel to close, tail --pid follows it out
+        tail = f"tail -c +{self.start + 1} -F --pid=$$ {shlex.quote(self.path)} 2>/dev/null"
+        return f"{filter_command(tail, self.grep)} & read -r _"
+
+    def catchup_command(self, offset: int, end: int) -> str:
+        return filter_command(f"tail -c +{offset + 1} {shlex.quote(self.path)} | head -c {end - offset}", self.grep)
+
+    async def run(self, on_close):
+        # the tail outlives the request opening it
+        request_deadline.set(None)
+        try:
+            async for event in iter_events(self.connection, self.command(), self.start):
+                if len(self.recent) >= RECENT_LINES:
+                    self.covered_from = self.recent.popleft()[0]
+                self.recent.append(event)
+                for queue in list(self.viewers):
+                    try:
+                        queue.put_nowait(event)
+                    except asyncio.QueueFull:
+                        logger.warning(f"Dropping slow viewer of {self.path}")
+                        self.drop(queue)
+        except Exception as e:
+            logger.error(f"Log tail of {self.path} failed: {str(e)}")
+        finally:
+            on_close(self)
+            for queue in list(self.viewers):
+                self.drop(queue)
+
+    def drop(self, queue: asyncio.Queue):
+        """end a viewer, its queue is emptied so the end marker fits"""
+        self.viewers.discard(queue)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    def subscribe(self) -> asyncio.Queue:
+        """register a viewer, live events are queued for it from now on"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=VIEWER_QUEUE)
+        self.viewers.add(queue)
+        return queue
+
+    async def follow(self, queue: asyncio.Queue, offset: int | None) -> AsyncIterator[Event]:
+        """
+        Events after a cursor, older ranges first, then live.
+
+        Args:
+            queue: live events of the viewer, from subscribe
+            offset: byte offset of the last event the viewer has seen, None for live only
+        """
+        try:
+            last = self.start if offset is None else offset
+            if last < self.covered_from:
+                end = self.covered_from
+                async for event in iter_events(self.connection, self.catchup_command(last, end), last):
+                    yield event
+                last = end
+            for event in list(self.recent):
+                if event[0] > last:
+                    yield event
+                    last = event[0]
+            while True:
+                event = await queue.get()
+                if event is None:
+                    return
+                if event[0] > last:
+                    yield event
+                    last = event[0]
+        finally:
+            self.viewers.discard(queue)
+
+
+class LogTailHub:
+    """log tails keyed by host, path and filter, closed with their last viewer"""
+
+    def __init__(self):
+        self.tails: Dict[Tuple[str, str, str], LogTail] = {}
+
+    async def file_size(self, connection: Connection, path: str) -> int:
+        # stat doesn't tell whether the file is readable, test -r does
+        command = f"test -r {shlex.quote(path)} && stat -L -c %s {shlex.quote(path)}"
+        result = (await execute_commands(connection, {"size": command}))["size"]
+        size = result.stdout.strip()
+        if not size.isdigit():
+            raise FileNotFoundError(path)
+        return int(size)
+
+    async def open(self, host_key: str, connection: Connection, path: str, grep: str | None,
+                   offset: int | None) -> Tuple[LogTail, asyncio.Queue, int | None]:
+        """
+        Find or start the shared tail of a remote file and subscribe a viewer to it.
+
+        The viewer counts from here on, the tail can't be stopped by another viewer
+        leaving before this one starts following it. Release it with release or follow.
+
+        Args:
+            host_key: ssh connection key of the host
+            connection: pooled connection of the host
+            path: remote file
+            grep: extended regular expression, only matching lines are sent
+            offset: byte offset to resume from, None starts at the end of the file
+
+        Returns:
+            Tuple[LogTail, asyncio.Queue, int | None]: the tail, the queue of the viewer
+            and the offset to follow it from
+
+        Raises:
+            FileNotFoundError: If the remote file can't be read
+        """
+        key = (host_key, path, grep or "")
+        tail = self.running(key)
+        if tail is not None:
+            return tail, tail.subscribe(), offset
+
+        size = await self.file_size(connection, path)
+        # an offset past the end is from before a rotation, start over at the end
+        if offset is not None and offset > size:
+            offset = None
+        # another viewer may have opened it while we were waiting
+        tail = self.running(key)
+        if tail is None:
+            tail = LogTail(key, connection, path, grep, size if offset is None else offset)
+            self.tails[key] = tail
+            tail.task = asyncio.create_task(tail.run(self.closed))
+            logger.info(f"Following {path} on {host_key} from offset {tail.start}")
+        return tail, tail.subscribe(), offset
+
+    def running(self, key: Tuple[str, str, str]) -> LogTail | None:
+        """the shared tail of a key, a tail whose task has ended is forgotten and started anew"""
+        tail = self.tails.get(key)
+        if tail is not None and tail.task is not None and tail.task.done():
+            self.closed(tail)
+            return None
+        return tail
+
+    async def follow(self, tail: LogTail, queue: asyncio.Queue, offset: int | None) -> AsyncIterator[Event]:
+        """events of an opened tail, the tail stops with its last viewer"""
+        events = tail.follow(queue, offset)
+        try:
+            async for event in events:
+                yield event
+        finally:
+            await events.aclose()
+            self.release(tail, queue)
+
+    def release(self, tail: LogTail, queue: asyncio.Queue):
+        """unsubscribe a viewer, the tail stops when nobody is left, releasing twice is harmless"""
+        tail.viewers.discard(queue)
+        if not tail.viewers and tail.task is not None:
+            self.closed(tail)
+            tail.task.cancel()
+
+    def closed(self, tail: LogTail):
+        if self.tails.get(tail.key) is tail:
+            del self.tails[tail.key]
+            logger.info(f"Stopped following {tail.path} on {tail.key[0]}")
+
+
+# create one log tail hub
+LOG_TAILS = LogTailHub()
+
+
+def get_log_tails() -> LogTailHub:
+    return LOG_TAILS
@@ -0,0 +1,211 @@
+"""Declarative output parsers for command sets.
+
+A parser is declared per command in cmds.yaml and compiled once when the file is
+loaded. Parsing never raises: every field that can't be read is recorded in the
+errors of the ParseResult and the other fields are still returned.
+"""
+
+import json
+import re
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List
+from models.cmds_models import PARSER
+
+
+def to_percent(value: str) -> float:
+    return float(value.strip().rstrip('%'))
+
+
+def to_bool(value: str) -> bool:
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# field types usable in cmds.yaml
+CONVERTERS: Dict[str, Callable[[str], Any]] = {
+    "str": lambda value: value.strip(),
+    "int": lambda value: int(value.strip()),
+    "float": lambda value: float(value.strip()),
+    "percent": to_percent,
+    "bool": to_bool,
+}
+
+
+class ParseResult:
+    """typed fields and per field errors"""
+
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self.errors: Dict[str, str] = {}
+
+    def merge(self, other: "ParseResult"):
+        self.fields.update(other.fields)
+        self.errors.update(other.errors)
+
+
+class Parser(ABC):
+    """base parser, subclasses split the output into raw values"""
+
+    def __init__(self, name: str, spec: PARSER):
+        self.name = name
+        self.spec = spec
+        self.target = spec.into or name
+        self.exclude = re.compile(spec.exclude) if spec.exclude else None
+        unknown = set(spec.fields.values()) - set(CONVERTERS)
+        if unknown:
+            raise ValueError(f"parser {name} uses unknown field types {sorted(unknown)}")
+        self.converters = {field: CONVERTERS[kind] for field, kind in spec.fields.items()}
+
+    def outputs(self) -> List[str]:
+        """names of the fields this parser produces"""
+        return [self.target] if self.spec.rows else list(self.converters)
+
+    @abstractmethod
+    def split(self, text: str) -> Dict[str, str] | List[str] | None:
+        """raw values of one record, by field name or by position"""
+
+    def convert(self, raw, errors: Dict[str, str], prefix: str | None = None) -> Dict[str, Any]:
+        """typed values, errors are keyed by field, or by row and field"""
+        values = {}
+        if isinstance(raw, list):
+            if len(raw) < len(self.converters):
+                errors[prefix or self.name] = f"expected {len(self.converters)} values, got {len(raw)}"
+                return values
+            raw = dict(zip(self.converters, raw))
+        for field, converter in self.converters.items():
+            key = f"{prefix}.{field}" if prefix else field
+            if raw.get(field) is None:
+                errors[key] = "missing"
+                continue
+            try:
+                values[field] = converter(raw[field])
+            except (TypeError, ValueError) as e:
+                errors[key] = str(e)
+        return values
+
+    def lines(self, text: str) -> List[str]:
+        return [line for line in text.splitlines()
+                if line.strip() and not (self.exclude and self.exclude.search(line))]
+
+    def parse(self, text: str) -> ParseResult:
+        result = ParseResult()
+        if self.spec.rows:
+            rows = []
+            for number, line in enumerate(self.lines(text)):
+                row_errors = {}
+                raw = self.split(line)
+                if raw is None:
+                    result.errors[f"{self.target}[{number}]"] = "no match"
+                    continue
+                row = self.convert(raw, row_errors, f"{self.target}[{number}]")
+                result.errors.update(row_errors)
+                if not row_errors:
+                    rows.append(row)
+            result.fields[self.target] = rows
+            return result
+
+        text = "\n".join(self.lines(text))
+        raw = self.split(text)
+        if raw is None:
+            for field in self.converters:
+                result.errors[field] = "no match"
+            return result
+        result.fields.update(self.convert(raw, result.errors))
+        return result
+
+
+class RegexParser(Parser):
+    """named groups, or groups in the order of the fields"""
+
+    def __init__(self, name: str, spec: PARSER):
+        super().__init__(name, spec)
+        if not spec.pattern:
+            raise ValueError(f"regex parser {name} needs a pattern")
+        self.pattern = re.compile(spec.pattern, re.MULTILINE)
+
+    def split(self, text):
+        match = self.pattern.search(text)
+        if match is None:
+            return None
+        return match.groupdict() or list(match.groups())
+
+
+class ColumnsParser(Parser):
+    """whitespace separated columns in the order of the fields"""
+
+    def split(self, text):
+        return text.split(self.spec.separator, len(self.converters) - 1) if self.spec.separator \
+            else text.split(None, len(self.converters) - 1)
+
+
+class CsvParser(Parser):
+    """comma separated values in the order of the fields"""
+
+    def split(self, text):
+        return [value.strip() for value in text.split(self.spec.separator or ",")]
+
+
+class KeyValueParser(Parser):
+    """'key: value' or 'key=value' lines, fields are keys"""
+
+    def __init__(self, name: str, spec: PARSER):
+        super().__init__(name, spec)
+        if spec.rows:
+            raise ValueError(f"kv parser {name} can't parse rows")
+
+    def split(self, text):
+        pairs = {}
+        for line in text.splitlines():
+            key, sep, value = line.partition(self.spec.separator or ("=" if "=" in line else ":"))
+            if sep:
+                pairs[key.strip()] = value.strip()
+        return pairs
+
+
+class JsonParser(Parser):
+    """json object, fields are top level keys"""
+
+    def split(self, text):
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return None
+        if not isinstance(data, dict):
+            return None
+        return {key: value if isinstance(value, str) else json.dumps(value) for key, value in data.items()}
+
+
+# parser registry
+PARSERS = {
+    "regex": RegexParser,
+    "columns": ColumnsParser,
+    "csv": CsvParser,
+    "kv": KeyValueParser,
+    "json": JsonParser,
+}
+
+
+def compile_parser(name: str, spec: PARSER) -> Parser:
+    return PARSERS[spec.type](name, spec)
+
+
+def parse_results(parsers: Dict[str, Parser], results: Dict) -> ParseResult:
+    """
+    Parse the results of execute_commands.
+
+    Args:
+        parsers: compiled parsers, keyed by command name
+        results: Result objects, keyed by command name
+
+    Returns:
+        ParseResult: fields of every parsed command and the errors of the failed ones
+    """
+    parsed = ParseResult()
+    for name, parser in parsers.items():
+        result = results.get(name)
+        if result is None:
+            continue
+        if not result.ok:
+            parsed.errors[name] = f"command failed with exit code {result.exited}"
+            continue
+        parsed.merge(parser.parse(result.stdout or ""))
+    return parsed
@@ -0,0 +1,181 @@
+"""Polling scheduler collecting server status in the background.
+
+Hosts are spread over the poll interval by a hash based phase offset, every run gets a
+small jitter, and each host adapts its own interval: stable or unreachable hosts back
+off, hosts close to a threshold are polled at the minimum interval.
+"""
+
+import asyncio
+import random
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict
+from sqlmodel import Session, select
+from api.server_api import get_server_status_linux
+from database.db import get_engine
+from envset.config import get_config
+from job.scheduler import SCHEDULER
+from job.snapshots import get_snapshot_store
+from logger import get_logger
+from models.config_models import PollerSettings
+from models.server_models import ServerAccountDB, ServerPublic
+from ssh.admission import ssh_priority
+from ssh.gateway import Route, fleet_routes
+from ssh.ssh_manager import SSHConnectionManager
+
+logger = get_logger("main.poller")
+
+
+@dataclass
+class PollState:
+    ip: str
+    port: int
+    username: str
+    password: str
+    interval: float
+    route: Route = ()
+    failures: int = 0
+    last: ServerPublic | None = field(default=None, repr=False)
+
+
+class HostPoller:
+    """poll every registered host on its own adaptive schedule"""
+
+    def __init__(self, settings: PollerSettings):
+        self.settings = settings
+        self.hosts: Dict[str, PollState] = {}
+        self.loop: asyncio.AbstractEventLoop | None = None
+
+    def phase_offset(self, key: str) -> float:
+        """deterministic start offset of a host inside the base interval"""
+        return zlib.crc32(key.encode()) % 1000 / 1000 * self.settings.interval
+
+    def jittered(self, interval: float) -> float:
+        jitter = interval * self.settings.jitter
+        return max(1.0, interval + random.uniform(-jitter, jitter))
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.sync_hosts()
+        SCHEDULER.add_job(self.sync_hosts, "interval", seconds=self.settings.interval,
+                          id="poller_sync_hosts", replace_existing=True)
+        logger.info(f"Host poller started with {len(self.hosts)} hosts")
+
+    def stop(self):
+        for key in list(self.hosts):
+            self.unschedule(key)
+        self.hosts.clear()
+
+    def sync_hosts(self):
+        """follow the registered server accounts, one poll per distinct connection"""
+        with Session(get_engine()) as session:
+            accounts = session.exec(select(ServerAccountDB)).all()
+
+        routes = fleet_routes(accounts)
+        current = {}
+        for account in accounts:
+            route = routes.get((account.username, account.server_name))
+            if route is None:
+                continue
+            key = SSHConnectionManager.connection_key(account.server_ip, account.account_name, account.server_port,
+                                                      route)
+            current[key] = account, route
+
+        for key in set(self.hosts) - set(current):
+            self.unschedule(key)
+            del self.hosts[key]
+            get_snapshot_store().remove(key)
+
+        for key, (account, route) in current.items():
+            state = self.hosts.get(key)
+            if state is None:
+                self.hosts[key] = PollState(ip=account.server_ip,
+                                            port=account.server_port,
+                                            username=account.account_name,
+                                            password=account.account_password,
+                                            interval=self.settings.interval,
+                                            route=route)
+                self.schedule(key, self.phase_offset(key))
+            else:
+                # gateway passwords are part of the route
+                state.password = account.account_password
+                state.route = route
+
+    def schedule(self, key: str, delay: float):
+        SCHEDULER.add_job(self.fire, "date", args=[key],
+                          run_date=datetime.now() + timedelta(seconds=delay),
+                          id=f"poll:{key}", replace_existing=True, misfire_grace_time=None)
+
+    def unschedule(self, key: str):
+        try:
+            SCHEDULER.remove_job(f"poll:{key}")
+        except Exception:
+            pass
+
+    def fire(self, key: str):
+        """scheduler thread, hand the poll over to the api event loop"""
+        if self.loop is None or self.loop.is_closed() or key not in self.hosts:
+            return
+        asyncio.run_coroutine_threadsafe(self.poll(key), self.loop)
+
+    async def poll(self, key: str):
+        state = self.hosts.get(key)
+        if state is None:
+            return
+        # background polls give way to interactive requests and tasks
+        ssh_priority.set("poll")
+        try:
+            snapshot = await get_server_status_linux(state.ip, state.username, state.password, state.port,
+                                                     route=state.route)
+        except Exception as e:
+            logger.debug(f"Poll of {key} failed: {e}")
+            snapshot = None
+
+        state.interval = self.next_interval(state, snapshot)
+        if snapshot is not None and snapshot.success:
+            state.failures = 0
+            state.last = snapshot
+        else:
+            state.failures += 1
+
+        if key in self.hosts:
+            self.schedule(key, self.jittered(state.interval))
+
+    def next_interval(self, state: PollState, snapshot: ServerPublic | None) -> float:
+        settings = self.settings
+        if snapshot is None or not snapshot.success:
+            # unreachable, back off
+            return min(state.interval * settings.backoff, settings.max_interval)
+
+        if self.is_hot(snapshot):
+            return settings.min_interval
+
+        if state.last is not None and self.is_stable(state.last, snapshot):
+            return min(state.interval * settings.backoff, settings.max_interval)
+
+        return settings.interval
+
+    def is_hot(self, snapshot: ServerPublic) -> bool:
+        """any metric close to its threshold"""
+        threshold = self.settings.hot_threshold
+        usages = [snapshot.cpu_usage, snapshot.memory_usage]
+        usages += [disk.usage for disk in snapshot.disks or []]
+        usages += [gpu.usage for gpu in snapshot.gpus or []]
+        return any(usage is not None and usage >= threshold for usage in usages)
+
+    def is_stable(self, last: ServerPublic, snapshot: ServerPublic) -> bool:
+        delta = self.settings.stable_delta
+        pairs = [(last.cpu_usage, snapshot.cpu_usage), (last.memory_usage, snapshot.memory_usage)]
+        return all(a is not None and b is not None and abs(a - b) < delta for a, b in pairs)
+
+
+# create one host poller, on first use
+HOST_POLLER: HostPoller | None = None
+
+
+def get_host_poller() -> HostPoller:
+    global HOST_POLLER
+    if HOST_POLLER is None:
+        HOST_POLLER = HostPoller(get_config().poller)
+    return HOST_POLLER
@@ -0,0 +1,93 @@
+"""Connection pre-warming after a restart.
+
+Every distinct server account connection is opened once in the background, so the
+first /server call after a deploy finds its connections in the pool. Opens run at
+the poll class, below every request, and a few at a time. Hosts that can't be reached
+open their circuit on the way, later calls fail fast instead of waiting for a timeout.
+"""
+
+import asyncio
+import time
+from typing import Dict, List, Tuple
+from sqlmodel import Session, select
+from database.db import get_engine
+from envset.config import get_config
+from logger import get_logger
+from models.server_models import PrewarmStatus, ServerAccountDB
+from ssh.admission import ssh_priority
+from ssh.gateway import Route, fleet_routes
+from ssh.ssh_manager import SSHConnectionManager, get_ssh_connection
+
+logger = get_logger("main.prewarm")
+
+
+def distinct_accounts() -> List[Tuple[ServerAccountDB, Route]]:
+    """one server account and its route per pooled connection"""
+    with Session(get_engine()) as session:
+        accounts = session.exec(select(ServerAccountDB)).all()
+    routes = fleet_routes(accounts)
+    distinct: Dict[str, Tuple[ServerAccountDB, Route]] = {}
+    for account in accounts:
+        route = routes.get((account.username, account.server_name))
+        if route is None:
+            continue
+        key = SSHConnectionManager.connection_key(account.server_ip, account.account_name, account.server_port,
+                                                  route)
+        distinct.setdefault(key, (account, route))
+    return list(distinct.values())
+
+
+class ConnectionPrewarmer:
+    """open the connection of every registered account once, in the background"""
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.status = PrewarmStatus()
+        self.task: asyncio.Task | None = None
+
+    def start(self):
+        self.status = PrewarmStatus(enabled=True)
+        self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    async def run(self):
+        start = time.perf_counter()
+        # background opens give way to every request
+        ssh_priority.set("poll")
+        try:
+            accounts = await asyncio.to_thread(distinct_accounts)
+        except Exception as e:
+            logger.error(f"Connection pre-warm could not read the server accounts: {str(e)}")
+            accounts = []
+        self.status.total = len(accounts)
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def open_connection(account: ServerAccountDB, route: Route):
+            async with semaphore:
+                try:
+                    await get_ssh_connection(account.server_ip, account.account_name,
+                                             account.account_password, account.server_port, route)
+                    self.status.opened += 1
+                except Exception as e:
+                    logger.debug(f"Pre-warm of {account.account_name}@{account.server_ip} failed: {e}")
+                    self.status.failed += 1
+
+        await asyncio.gather(*(open_connection(account, route) for account, route in accounts))
+        self.status.finished = True
+        self.status.duration = round(time.perf_counter() - start, 3)
+        logger.info(f"Pre-warmed {self.status.opened} of {self.status.total} ssh connections "
+                    f"in {self.status.duration}s, {self.status.failed} failed")
+
+
+# create one connection prewarmer, on first use
+PREWARMER: ConnectionPrewarmer | None = None
+
+
+def get_prewarmer() -> ConnectionPrewarmer:
+    global PREWARMER
+    if PREWARMER is None:
+        PREWARMER = ConnectionPrewarmer(get_config().ssh.prewarm_concurrency)
+    return PREWARMER
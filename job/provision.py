@@ -0,0 +1,148 @@
+"""Bulk account provisioning module, creating or locking accounts on many hosts.
+
+The command sets are templates in cmds.yaml. Every host first gets one getent call for
+all requested accounts, accounts already in the target state are skipped, so running
+the same request again only touches what is left.
+"""
+
+import re
+import shlex
+import time
+from datetime import datetime
+from typing import List, Set
+from job.fleet import SUDO_PROMPT, HostHandler, run_commands
+from job.history import get_job_recorder
+from job.scheduler import to_command_results
+from models.account_models import HostProvisionResult, ProvisionAccount
+from models.server_models import ServerAccountDB
+from models.tasks_models import CMDS, CommandResult, HostTaskResult
+from ssh.admission import ssh_priority
+from ssh.gateway import resolve_route
+from ssh.ssh_manager import get_ssh_connection
+
+# action -> command set in cmds.yaml
+ACCOUNT_CMDS = {
+    "create": "CMD_Account_Create",
+    "lock": "CMD_Account_Lock",
+}
+
+# step name of the getent check in the host results, can't clash with an account name
+CHECK_STEP = "@check"
+# separates the passwd and shadow parts of the check output
+SHADOW_MARK = "--shadow--"
+
+TEMPLATE_FIELD = re.compile(r"\{(account|password_hash)\}")
+
+
+def render_command(template: str, account: ProvisionAccount) -> str:
+    """fill the account fields into a command template, other braces are left alone"""
+    values = account.model_dump()
+    return TEMPLATE_FIELD.sub(lambda match: shlex.quote(values[match.group(1)]), template)
+
+
+def check_command(action: str, names: List[str]) -> str:
+    """one getent for all accounts, shadow tells whether an account is locked and expired"""
+    quoted = " ".join(shlex.quote(name) for name in names)
+    command = f"getent passwd {quoted} | cut -d: -f1"
+    if action == "lock":
+        command += f"; echo {SHADOW_MARK}; getent shadow {quoted} | cut -d: -f1,2,8"
+    return command
+
+
+def done_accounts(action: str, output: str, names: List[str]) -> Set[str]:
+    """accounts already in the target state according to the getent output"""
+    passwd, _, shadow = output.partition(SHADOW_MARK)
+    existing = {line.strip() for line in passwd.splitlines() if line.strip()}
+    if action == "create":
+        return {name for name in names if name in existing}
+
+    entries = {}
+    for line in shadow.splitlines():
+        name, _, rest = line.strip().partition(":")
+        entries[name] = rest
+    # missing accounts have nothing to lock, an unreadable shadow entry is not known to be locked
+    return {name for name in names
+            if name not in existing or (entries.get(name, "").startswith("!") and entries[name].endswith(":1"))}
+
+
+def provision_host_handler(action: str,
+                           cmds: CMDS,
+                           accounts: List[ProvisionAccount],
+                           sudo: bool = True,
+                           username: str | None = None,
+                           batch_id: str | None = None) -> HostHandler:
+    """
+    Build a host handler creating or locking accounts and recording it in the job history.
+
+    The host results hold the getent check under CHECK_STEP and the command results of
+    every changed account under its account name.
+
+    Args:
+        action: create or lock
+        cmds: Command set with the templates of the action
+        accounts: Accounts to bring into the target state
+        sudo: Run the commands through sudo with the password of the server account
+        username: User that started the run
+        batch_id: Id shared by the hosts of one fleet run
+    """
+    names = [account.account for account in accounts]
+
+    async def handler(account: ServerAccountDB) -> HostTaskResult:
+        started_at = datetime.now()
+        start = time.perf_counter()
+        host = HostTaskResult(server_name=account.server_name,
+                              server_ip=account.server_ip,
+                              server_port=account.server_port,
+                              success=False)
+        token = ssh_priority.set("task")
+        try:
+            connection = await get_ssh_connection(account.server_ip, account.account_name,
+                                                  account.account_password, account.server_port,
+                                                  await resolve_route(account))
+            check = await run_commands(connection, account, {"getent": check_command(action, names)}, sudo)
+            host.results[CHECK_STEP] = to_command_results(check)
+            if not check["getent"].ok:
+                host.message = f"account check failed: {error_text(host.results[CHECK_STEP]['getent'])}"
+            else:
+                done = done_accounts(action, check["getent"].stdout, names)
+                for wanted in accounts:
+                    if wanted.account in done:
+                        continue
+                    commands = {name: render_command(template, wanted) for name, template in cmds.cmds.items()}
+                    results = await run_commands(connection, account, commands, sudo, timeouts=cmds.timeout)
+                    host.results[wanted.account] = to_command_results(results)
+                host.success = all(result.ok for step in host.results.values() for result in step.values())
+        finally:
+            ssh_priority.reset(token)
+        host.duration = round(time.perf_counter() - start, 3)
+        host.job_id = get_job_recorder().record(cmds.name, host, started_at, username, batch_id)
+        return host
+
+    return handler
+
+
+def error_text(result: CommandResult) -> str:
+    """stderr of a failed command without the sudo prompt"""
+    return result.stderr.replace(SUDO_PROMPT, "").strip()
+
+
+def host_report(host: HostTaskResult, names: List[str]) -> HostProvisionResult:
+    """changed, skipped and failed accounts of one host"""
+    report = HostProvisionResult(**host.model_dump(include=set(HostProvisionResult.model_fields)))
+    check = host.results.get(CHECK_STEP, {}).get("getent")
+    if check is None or not check.ok:
+        # nothing ran on this host
+        reason = host.message or (error_text(check) if check else "") or "host failed"
+        report.failed = {name: reason for name in names}
+        return report
+
+    for name in names:
+        results = host.results.get(name)
+        if results is None:
+            report.skipped.append(name)
+        elif all(result.ok for result in results.values()):
+            report.changed.append(name)
+        else:
+            failed = next(result for result in results.values() if not result.ok)
+            report.failed[name] = error_text(failed) or f"exit code {failed.exit_code}"
+    return report
@@ -1,17 +1,32 @@
 """Task scheduling module for managing background tasks and periodic jobs."""
 
+import asyncio
+from types import SimpleNamespace
+from typing import Dict
 from apscheduler.schedulers.background import BackgroundScheduler
+from fastapi import HTTPException
 from job.cmds_pool import get_cmds_all
+from job.history import truncate_output
 from logger import get_logger
 from job.task_pool import get_tasks_all
-from ssh.ssh_manager import execute_commands, get_ssh_connection
+from job.workers import get_worker_pool
+from models.tasks_models import CommandResult
+from ssh.ssh_manager import empty_result, execute_commands, get_ssh_connection
 
 logger = get_logger("main.task_scheduler")
 
 SCHEDULER = BackgroundScheduler()
 
+# characters of command output written to the log
+LOG_OUTPUT_LIMIT = 2000
 
-async def cmd_handler(cmd_name, ip, port, username, password):
+
+def failed_results(cmd_name: str, reason: str) -> Dict[str, SimpleNamespace]:
+    """a failed result standing for a command set that didn't run, the reason is its stderr"""
+    return {cmd_name: SimpleNamespace(**{**vars(empty_result), "command": cmd_name, "stderr": reason})}
+
+
+async def cmd_handler(cmd_name, ip, port, username, password, route=()):
     """Execute a command on a remote server via SSH
     
     Args:
@@ -20,12 +35,12 @@ async def cmd_handler(cmd_name, ip, port, username, password):
         port: SSH port number
         username: SSH username
         password: SSH password
+        route: Gateways the server is reached through
         
     Returns:
-        Dict[str, Result]: Dictionary of Result objects with command execution results
-        
-    Raises:
-        Exception: If command execution fails
+        Dict[str, Result]: Dictionary of Result objects with command execution results, a
+        command set that couldn't run (unknown, host unreachable or busy, deadline passed)
+        gives one failed result named after it with the reason in stderr
     """
     try:
         # Get command set and refresh to ensure latest commands
@@ -36,26 +51,32 @@ async def cmd_handler(cmd_name, ip, port, username, password):
         cmds = cmd_sets.get_cmds()[cmd_name]
         
         # Establish SSH connection
-        connection = await get_ssh_connection(ip, username, password, port)
+        connection = await get_ssh_connection(ip, username, password, port, route)
         if not connection:
             logger.error(f"Failed to establish SSH connection to {ip}:{port}")
-            return {}
+            return failed_results(cmd_name, "could not connect to the server")
             
         # Execute commands and return results
         logger.info(f"Executing command set '{cmd_name}' on {ip}:{port}")
-        results = await execute_commands(connection, cmds.cmds)
+        results = await execute_commands(connection, cmds.cmds, output=cmds.output, timeouts=cmds.timeout)
         return results
         
     except KeyError:
         logger.error(f"Command '{cmd_name}' not found in command definitions")
-        return {}
+        return failed_results(cmd_name, f"command set '{cmd_name}' not found")
     except Exception as e:
-        logger.error(f"Error executing command '{cmd_name}': {str(e)}")
-        return {}
+        # busy, open circuit and deadline answers carry their reason in the detail
+        reason = e.detail if isinstance(e, HTTPException) else str(e)
+        logger.error(f"Error executing command '{cmd_name}': {reason}")
+        return failed_results(cmd_name, reason)
 
 
-async def task_handler(task_name, ip, port, username, password):
-    """Handle task execution by running a sequence of commands
+async def task_handler(task_name, ip, port, username, password, route=()):
+    """Handle task execution by running the task steps as a dependency graph
+
+    Steps whose dependencies have all succeeded run concurrently on the pooled
+    connection of the host. A step whose dependencies failed is skipped, and the
+    fail_fast policy cancels every remaining step on the first failure.
     
     Args:
         task_name: Name of the task to execute from tasks.yaml
@@ -63,29 +84,65 @@ async def task_handler(task_name, ip, port, username, password):
         port: SSH port number
         username: SSH username 
         password: SSH password
+        route: Gateways the server is reached through
         
     Returns:
-        None
+        Dict[str, Dict[str, Result]]: results of each finished step, keyed by step name
     """
     logger.info(f"Task '{task_name}' started on {ip}:{port}")
-    
+    task_results = {}
+
     try:
         # Get task configuration
         task = get_tasks_all().get_task()[task_name]
-        
-        # Execute each command in the task
-        for cmd in task.cmds:
-            logger.info(f"Executing command '{cmd.name}' as part of task '{task_name}'")
-            results = await cmd_handler(cmd.name, ip, port, username, password)
-            await results_handler(results)
-            
-        logger.info(f"Task '{task_name}' completed successfully")
+        pending = {step.name: step for step in task.tasks}
+        running: Dict[asyncio.Task, str] = {}
+        succeeded: Dict[str, bool] = {}
+
+        while pending or running:
+            # start every step whose dependencies are finished
+            for step in [step for step in pending.values() if all(dep in succeeded for dep in step.after)]:
+                del pending[step.name]
+                if all(succeeded[dep] for dep in step.after):
+                    logger.info(f"Executing command '{step.name}' as part of task '{task_name}'")
+                    job = asyncio.create_task(cmd_handler(step.cmds.name, ip, port, username, password, route))
+                    running[job] = step.name
+                else:
+                    logger.warning(f"Skipping step '{step.name}' of task '{task_name}', a dependency failed")
+                    succeeded[step.name] = False
+
+            if not running:
+                # skipped steps may have unblocked other steps
+                continue
+
+            finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for job in finished:
+                step_name = running.pop(job)
+                results = job.result()
+                await results_handler(results)
+                task_results[step_name] = results
+                succeeded[step_name] = bool(results) and all(result.ok for result in results.values())
+
+            if task.policy == "fail_fast" and not all(succeeded.values()):
+                logger.error(f"Task '{task_name}' has a failed step, cancelling {list(running.values())}")
+                for job in running:
+                    job.cancel()
+                running.clear()
+                pending.clear()
+
+        if all(succeeded.values()):
+            logger.info(f"Task '{task_name}' completed successfully")
+        else:
+            failed = [name for name, ok in succeeded.items() if not ok]
+            logger.error(f"Task '{task_name}' completed with failed steps: {failed}")
         
     except KeyError:
         logger.error(f"Task '{task_name}' not found in task definitions")
     except Exception as e:
         logger.error(f"Error executing task '{task_name}': {str(e)}")
 
+    return task_results
+
 
 async def results_handler(results):
     """Process command execution results, output stdout and stderr, and log results
@@ -96,10 +153,10 @@ async def results_handler(results):
     for cmd_name, result in results.items():
         if result.ok:
             logger.info(f"Command '{cmd_name}' executed successfully")
-            logger.info(f"Output: {result.stdout.strip()}")
+            logger.info(f"Output: {truncate_output(result.stdout.strip(), LOG_OUTPUT_LIMIT)}")
         else:
             logger.error(f"Command '{cmd_name}' failed with exit code: {result.exited}")
-            logger.error(f"Error message: {result.stderr.strip()}")
+            logger.error(f"Error message: {truncate_output(result.stderr.strip(), LOG_OUTPUT_LIMIT)}")
             
         # Detailed logging
         logger.debug(f"Command details - '{cmd_name}':")
@@ -108,6 +165,41 @@ async def results_handler(results):
         logger.debug(f"  stdout: {result.stdout}")
         logger.debug(f"  stderr: {result.stderr}")
 
+
+def to_command_results(results) -> Dict[str, CommandResult]:
+    """Convert Result objects returned by execute_commands into serializable models"""
+    return {
+        cmd_name: CommandResult(
+            command=result.command,
+            exit_code=result.exited,
+            ok=result.ok,
+            stdout=result.stdout,
+            stderr=result.stderr,
+            duration=getattr(result, "duration", None),
+        )
+        for cmd_name, result in results.items()
+    }
+
+
+async def dispatch_task(task_name, ip, port, username, password, route=()) -> Dict[str, Dict[str, CommandResult]]:
+    """Run a task on the configured backend
+
+    The thread backend runs the task in this event loop, the process backend sends it
+    to the worker process owning the host.
+
+    Returns:
+        Dict[str, Dict[str, CommandResult]]: results of each finished step, keyed by step name
+    """
+    pool = get_worker_pool()
+    if pool is None:
+        task_results = await task_handler(task_name, ip, port, username, password, route)
+        return {step: to_command_results(results) for step, results in task_results.items()}
+
+    payload = await pool.submit(task_name, ip, port, username, password, route)
+    return {step: {name: CommandResult(**result) for name, result in results.items()}
+            for step, results in payload.items()}
+
+
 def task_cmds_update(cmds_name,task):
     task.task.cmds[cmds_name]
 # TODO：定时任务触发
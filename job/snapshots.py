@@ -0,0 +1,79 @@
+"""Snapshot store keeping the latest status of every polled host.
+
+Every change of a snapshot gets a new version from one monotonically increasing
+counter, and the version of each changed field is kept, so clients can ask for
+everything newer than a version they have already seen. The counter starts from the
+clock, so versions stay increasing across restarts.
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Set
+from models.server_models import ServerPublic
+
+# fields that change on every collection without the status itself changing
+VOLATILE_FIELDS = {"last_updated", "version"}
+
+
+class SnapshotStore:
+    """latest ServerPublic of each host, keyed by ssh connection key"""
+
+    def __init__(self):
+        self.snapshots: Dict[str, ServerPublic] = {}
+        self.updated_at: Dict[str, datetime] = {}
+        self.field_versions: Dict[str, Dict[str, int]] = {}
+        self.version = time.time_ns() // 1000
+        self.lock = threading.Lock()
+
+    def update(self, key: str, snapshot: ServerPublic) -> ServerPublic:
+        """
+        Store the latest status of a host.
+
+        Args:
+            key: ssh connection key of the host
+            snapshot: freshly collected status
+
+        Returns:
+            ServerPublic: the stored snapshot, the previous one when nothing changed
+        """
+        with self.lock:
+            self.updated_at[key] = datetime.now()
+            current = self.snapshots.get(key)
+            changed = [name for name in ServerPublic.model_fields
+                       if name not in VOLATILE_FIELDS
+                       and (current is None or getattr(current, name) != getattr(snapshot, name))]
+            if current is not None and not changed:
+                return current
+
+            self.version += 1
+            snapshot.version = self.version
+            versions = self.field_versions.setdefault(key, {})
+            for name in changed:
+                versions[name] = self.version
+            self.snapshots[key] = snapshot
+            return snapshot
+
+    def get(self, key: str) -> ServerPublic | None:
+        return self.snapshots.get(key)
+
+    def get_many(self, keys: List[str]) -> Dict[str, ServerPublic]:
+        return {key: self.snapshots[key] for key in keys if key in self.snapshots}
+
+    def changed_fields(self, key: str, since: int) -> Set[str]:
+        """fields of a host changed after a version"""
+        return {name for name, version in self.field_versions.get(key, {}).items() if version > since}
+
+    def remove(self, key: str):
+        with self.lock:
+            self.snapshots.pop(key, None)
+            self.updated_at.pop(key, None)
+            self.field_versions.pop(key, None)
+
+
+# create one snapshot store
+SNAPSHOT_STORE = SnapshotStore()
+
+
+def get_snapshot_store() -> SnapshotStore:
+    return SNAPSHOT_STORE
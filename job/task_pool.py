@@ -2,7 +2,7 @@ import yaml
 from pydantic import ValidationError
 from job.cmds_pool import get_cmds_all
 from logger import get_logger
-from models.tasks_models import TASK, CMDS
+from models.tasks_models import TASK, TASK_STEP, CMDS
 from utils import format_object_for_log
 
 logger = get_logger("main.task")
@@ -18,21 +18,29 @@ class TaskCreate:
         cmds = get_cmds_all()
         cmds.refresh()
         cmds_list = cmds.get_cmds()
-        try:
-            with open(self.tasks_path, "r", encoding="utf-8") as file:
-                buffer = yaml.safe_load(file)
-                for task_key in buffer:
-                    task = buffer[task_key]
-                    if task['activate']:
-                        task['tasks'] = [cmds_list[cmd] for cmd in task['tasks']]
-                        self.task[task_key] = TASK(**task)
-                        # output task info
-                        logger.info(format_object_for_log(self.task[task_key]))
-        except KeyError as e:
-            logger.error(f"Task {task_key} is not found in tasks.yaml")
-        except ValidationError as e:
-            logger.error(e)
-
+        with open(self.tasks_path, "r", encoding="utf-8") as file:
+            buffer = yaml.safe_load(file)
+        for task_key in buffer:
+            task = buffer[task_key]
+            try:
+                if task['activate']:
+                    task['tasks'] = [self.make_step(step, cmds_list) for step in task['tasks']]
+                    self.task[task_key] = TASK(**task)
+                    # output task info
+                    logger.info(format_object_for_log(self.task[task_key]))
+            except KeyError as e:
+                logger.error(f"Task {task_key} uses command {e} which is not found in cmds.yaml")
+            except ValidationError as e:
+                logger.error(e)
+
+    @staticmethod
+    def make_step(step, cmds_list):
+        """a step is a command set name, or {name: command set name, after: [step names]}"""
+        if isinstance(step, str):
+            step = {"name": step}
+        return TASK_STEP(name=step['name'],
+                         after=step.get('after') or [],
+                         cmds=cmds_list[step['name']])
 
     def get_task(self):
         if len(self.task) == 0:
@@ -42,9 +50,13 @@ class TaskCreate:
             return self.task
 
 
-TASKS_READER = TaskCreate("tasks.yaml")
+# tasks.yaml is read on first use
+TASKS_READER: TaskCreate | None = None
 
 
 def get_tasks_all():
+    global TASKS_READER
+    if TASKS_READER is None:
+        TASKS_READER = TaskCreate("tasks.yaml")
     TASKS_READER.get_task()
     return TASKS_READER
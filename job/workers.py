@@ -0,0 +1,228 @@
+"""Process worker backend running task executions outside the API process.
+
+Every worker process owns its own event loop and SSH connection pool. Jobs are routed
+to a worker by host, so connections to one host are reused by the same worker, and
+results travel back through one shared result queue. The collector also watches the
+workers, the jobs of a worker that died fail and the worker is started again.
+"""
+
+import asyncio
+import multiprocessing
+import queue
+import threading
+import time
+import zlib
+from typing import Dict, List, Tuple
+from uuid import uuid4
+from envset.config import get_config
+from logger import get_logger, init_logging
+from ssh.deadline import check_deadline, remaining
+
+logger = get_logger("main.workers")
+
+# seconds between liveness checks of the worker processes
+WATCH_INTERVAL = 1.0
+
+
+def worker_main(jobs, results, concurrency: int):
+    """entry point of one worker process, set up in the same order as the api process"""
+    start = time.perf_counter()
+    init_logging()
+    get_config()
+    asyncio.run(worker_loop(jobs, results, concurrency, start))
+
+
+async def worker_loop(jobs, results, concurrency: int, start: float):
+    # imported here so the api process never pays for it twice
+    from job.cmds_pool import get_cmds_all
+    from job.scheduler import task_handler, to_command_results
+    from job.task_pool import get_tasks_all
+    from ssh.admission import ssh_priority
+    from ssh.deadline import deadline
+    from ssh.ssh_manager import get_ssh_manager
+
+    get_cmds_all()
+    get_tasks_all()
+    ssh_manager = get_ssh_manager()
+    logger.info(f"Worker {multiprocessing.current_process().name} ready in "
+                f"{(time.perf_counter() - start) * 1000:.0f} ms")
+
+    # workers only run tasks, every job started below inherits the class
+    ssh_priority.set("task")
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+    running = set()
+
+    async def run_job(job_id, task_name, ip, port, username, password, route, timeout):
+        try:
+            # the request deadline travels as the seconds left when the job was sent
+            with deadline(timeout):
+                task_results = await task_handler(task_name, ip, port, username, password, route)
+            payload = {step: {name: result.model_dump() for name, result in to_command_results(step_results).items()}
+                       for step, step_results in task_results.items()}
+            results.put((job_id, payload, None))
+        except Exception as e:
+            results.put((job_id, None, str(e)))
+        finally:
+            semaphore.release()
+
+    while True:
+        # only take a job when there is room to run it
+        await semaphore.acquire()
+        item = await loop.run_in_executor(None, jobs.get)
+        if item is None:
+            break
+        job = asyncio.create_task(run_job(*item))
+        running.add(job)
+        job.add_done_callback(running.discard)
+
+    await asyncio.gather(*running)
+    await ssh_manager.close_all_connections()
+
+
+class ProcessWorkerPool:
+    """dispatch task executions to worker processes through multiprocessing queues"""
+
+    def __init__(self, workers: int, concurrency: int):
+        self.workers = workers
+        self.concurrency = concurrency
+        self.context = multiprocessing.get_context("spawn")
+        self.job_queues = []
+        self.results = None
+        self.processes = []
+        # job id -> loop, future and index of the worker running the job
+        self.futures: Dict[str, Tuple[asyncio.AbstractEventLoop, asyncio.Future, int]] = {}
+        self.collector = None
+        self.stopping = False
+
+    def spawn(self, index: int) -> Tuple[multiprocessing.Queue, multiprocessing.Process]:
+        jobs = self.context.Queue()
+        process = self.context.Process(target=worker_main,
+                                       args=(jobs, self.results, self.concurrency),
+                                       name=f"last-worker-{index}",
+                                       daemon=True)
+        process.start()
+        return jobs, process
+
+    def start(self):
+        self.results = self.context.Queue()
+        for index in range(self.workers):
+            jobs, process = self.spawn(index)
+            self.job_queues.append(jobs)
+            self.processes.append(process)
+        self.collector = threading.Thread(target=self.collect, name="last-worker-collector", daemon=True)
+        self.collector.start()
+        logger.info(f"Started {self.workers} task workers, {self.concurrency} jobs each")
+
+    def collect(self):
+        """hand results from the workers back to the waiting coroutines, restart dead workers"""
+        while True:
+            try:
+                item = self.results.get(timeout=WATCH_INTERVAL)
+            except queue.Empty:
+                self.check_workers()
+                continue
+            if item is None:
+                break
+            job_id, payload, error = item
+            loop, future, _ = self.futures.pop(job_id, (None, None, None))
+            if future is None:
+                continue
+            if error is None:
+                loop.call_soon_threadsafe(self.resolve, future, payload, None)
+            else:
+                loop.call_soon_threadsafe(self.resolve, future, None, RuntimeError(error))
+            self.check_workers()
+
+    def check_workers(self):
+        """fail the jobs of a worker that died, crashed or killed for memory, and start a new one"""
+        if self.stopping:
+            return
+        for index, process in enumerate(self.processes):
+            if process.is_alive():
+                continue
+            logger.error(f"Worker {process.name} exited with code {process.exitcode}, restarting it")
+            # new jobs go to the new worker before the old ones are failed, none can be left waiting
+            self.job_queues[index], self.processes[index] = self.spawn(index)
+            self.fail_jobs(RuntimeError(f"worker {process.name} exited with code {process.exitcode}"), index)
+
+    def fail_jobs(self, error: Exception, index: int | None = None):
+        """fail the waiting jobs of one worker, or of all workers"""
+        for job_id, (loop, future, worker) in list(self.futures.items()):
+            if index is None or worker == index:
+                self.futures.pop(job_id, None)
+                try:
+                    loop.call_soon_threadsafe(self.resolve, future, None, error)
+                except RuntimeError:
+                    # the loop is closed, nobody is waiting anymore
+                    pass
+
+    @staticmethod
+    def resolve(future: asyncio.Future, payload, error):
+        if future.done():
+            return
+        if error is None:
+            future.set_result(payload)
+        else:
+            future.set_exception(error)
+
+    async def submit(self, task_name, ip, port, username, password, route=()) -> Dict[str, Dict[str, dict]]:
+        """
+        Run a task in the worker owning the host, under the deadline of the current request.
+
+        Returns:
+            Dict[str, Dict[str, dict]]: dumped CommandResult of each command, keyed by step name
+
+        Raises:
+            HTTPException: 504 when the request deadline has already passed
+        """
+        job_id = uuid4().hex
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        index = zlib.crc32(f"{username}@{ip}:{port}".encode()) % len(self.job_queues)
+        self.futures[job_id] = (loop, future, index)
+        check_deadline()
+        self.job_queues[index].put((job_id, task_name, ip, port, username, password, route, remaining()))
+        try:
+            return await future
+        finally:
+            self.futures.pop(job_id, None)
+
+    def shutdown(self):
+        self.stopping = True
+        for jobs in self.job_queues:
+            jobs.put(None)
+        for process in self.processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        if self.results is not None:
+            self.results.put(None)
+        # nothing answers the jobs still waiting
+        self.fail_jobs(RuntimeError("task workers stopped"))
+        logger.info("Task workers stopped")
+
+    def alive(self) -> List[bool]:
+        return [process.is_alive() for process in self.processes]
+
+
+WORKER_POOL: ProcessWorkerPool | None = None
+
+
+def start_worker_pool(workers: int, concurrency: int) -> ProcessWorkerPool:
+    global WORKER_POOL
+    WORKER_POOL = ProcessWorkerPool(workers, concurrency)
+    WORKER_POOL.start()
+    return WORKER_POOL
+
+
+def get_worker_pool() -> ProcessWorkerPool | None:
+    return WORKER_POOL
+
+
+def stop_worker_pool():
+    global WORKER_POOL
+    if WORKER_POOL is not None:
+        WORKER_POOL.shutdown()
+        WORKER_POOL = None
@@ -114,6 +114,10 @@ class LoggerManager:
         # configure root logger
         self._configure_root_logger()
 
+        # loggers handed out before the init follow the new level
+        for logger in self.loggers.values():
+            logger.setLevel(self.log_level)
+
         self.initialized = True
         return self
 
@@ -153,10 +157,7 @@ class LoggerManager:
         root_logger.addHandler(file_handler)
 
     def get_logger(self, name) -> logging.Logger:
-        """get or create specify logger"""
-        if not self.initialized:
-            self.init_app()
-
+        """get or create specify logger, before init_app only warnings reach stderr"""
         if name not in self.loggers:
             logger = logging.getLogger(name)
             logger.setLevel(self.log_level)
@@ -191,10 +192,10 @@ class LoggerManager:
 # 创建日志管理器单例实例
 logger_manager = LoggerManager()
 
-LOG_LEVEL = os.getenv("LOG_LEVEL", "info")
 
-# 初始化日志管理器
-logger_manager.init_app(log_level=LOG_LEVEL, log_dir=os.getenv("LOG_DIR", "logs"))
+# 初始化日志管理器, 每个进程启动时调用一次
+def init_logging() -> LoggerManager:
+    return logger_manager.init_app(log_level=os.getenv("LOG_LEVEL", "info"), log_dir=os.getenv("LOG_DIR", "logs"))
 
 
 # 获取日志器的便捷函数
@@ -1,49 +1,108 @@
+import time
+
+# everything imported below counts as import time in the startup report
+IMPORT_START = time.perf_counter()
+
+import asyncio
 import uvicorn
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 from typing import Annotated
-from fastapi import Depends, FastAPI
+from fastapi import Depends, FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from api.account_api import AccountCreateDep, AccountLockDep
 from api.email_api import EmailConfirmDep, EmailConfirmSMTPDep
-from api.server_api import ServerDep, ServerAccountUpdater, ServerAccountCreater, ServerAccountdel
+from api.server_api import ServerDep, ServerOneDep, ServerAccountUpdater, ServerAccountCreater, ServerAccountdel, \
+    ServerPasswordRotator
+from api.fleet_api import FleetSummaryDep, FleetTopDep
+from api.health_api import ReadinessDep
+from api.server_import_api import ServerExportDep, ServerImportDep
+from api.job_api import JobListDep, JobDetailDep
+from api.log_api import LogFollowDep
+from api.task_api import FleetCommandDep, FleetTaskDep
 from api.user_api import UserLoginDep, token_authen, UserCreateDep, UserUpdateDep, UserDeleDep, create_admin_user
 from database.db import create_db_and_tables
 from envset.config import get_config
 from envset.envset import EnvSet
 from job.cmds_pool import get_cmds_all
-from logger import get_logger
+from logger import get_logger, init_logging
+from models.account_models import AccountProvisionResult
 from models.auth import Token
 from models.email_models import EmailConfirmRequest
-from models.server_models import ServerAccountPublic
+from models.jobs_models import JobRunDetail, JobRunList
+from models.server_models import FleetSummary, FleetTop, PasswordRotationResult, ReadinessStatus, ServerAccountPublic, \
+    ServerImportResult, ServerPublic, ServerPublicList
+from models.tasks_models import FleetTaskResult
 from models.user_models import UserInDB, UserPublic
-from ssh.ssh_manager import ssh_manager
+from ssh.deadline import DeadlineMiddleware
+from ssh.ssh_manager import get_ssh_manager
+from job.history import get_job_recorder, schedule_history_jobs
+from job.poller import get_host_poller
+from job.prewarm import get_prewarmer
 from job.scheduler import SCHEDULER
+from job.workers import start_worker_pool, stop_worker_pool
 from job.task_pool import get_tasks_all
+from utils.compression import CompressionMiddleware
+from utils.responses import model_response
+from utils.startup import StartupReport
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # start run
-    create_db_and_tables()
-    EnvSet()
-    # admin create
-    await create_admin_user()
-    SCHEDULER.start()
-    get_cmds_all()
-    get_tasks_all()
+    # nothing is set up at import time, every phase runs here in this order
+    startup = StartupReport(IMPORT_TIME)
+    with startup.phase("logging"):
+        init_logging()
+    with startup.phase("env"):
+        EnvSet()
+    with startup.phase("config"):
+        config = get_config()
+    # blocking ssh io runs in the default executor, size it for every admitted operation
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=config.ssh.max_active + 8, thread_name_prefix="ssh"))
+    with startup.phase("database"):
+        create_db_and_tables()
+        # admin create
+        await create_admin_user()
+    with startup.phase("commands"):
+        get_cmds_all()
+        get_tasks_all()
+    with startup.phase("ssh"):
+        ssh_manager = get_ssh_manager()
+        probes = asyncio.create_task(ssh_manager.probe_loop())
+        if config.ssh.prewarm:
+            # runs in the background, startup doesn't wait for it
+            get_prewarmer().start()
+    with startup.phase("scheduler"):
+        SCHEDULER.start()
+        schedule_history_jobs(SCHEDULER)
+    with startup.phase("workers"):
+        if config.job.backend == "process":
+            start_worker_pool(config.job.workers, config.job.worker_concurrency)
+    with startup.phase("poller"):
+        if config.poller.enabled:
+            get_host_poller().start(asyncio.get_running_loop())
+    logger.info(startup.summary())
+    app.state.startup = startup
+    app.state.ready = True
     yield
     # close run
+    app.state.ready = False
+    get_prewarmer().stop()
+    probes.cancel()
+    get_host_poller().stop()
     SCHEDULER.shutdown()
+    stop_worker_pool()
+    await asyncio.to_thread(get_job_recorder().flush)
     await ssh_manager.close_all_connections()
 
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # get the main logger
 logger = get_logger("main")
 
-# get config
-config = get_config()
-
 # CORSMiddleware
 origins = ["*", ]
 app.add_middleware(
@@ -54,6 +113,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# gzip / brotli, the settings are read once the config is loaded
+def compression_settings():
+    server = get_config().server
+    return {"minimum_size": server.compress_min_size,
+            "gzip_level": server.gzip_level,
+            "brotli_quality": server.brotli_quality}
+
+
+app.add_middleware(CompressionMiddleware, settings=compression_settings)
+
+# deadline of the ssh work of every request
+app.add_middleware(DeadlineMiddleware, timeout=lambda: get_config().ssh.request_timeout)
+
 
 #########################
 # API
@@ -67,6 +139,11 @@ async def login(token: UserLoginDep) -> Token:
         raise e
 
 
+@app.get("/ready")
+async def readiness(status: ReadinessDep) -> ReadinessStatus:
+    return status
+
+
 @app.get("/user", response_model=UserPublic)
 async def get_current_usr(user: Annotated[UserInDB, Depends(token_authen)]):
     return user
@@ -87,9 +164,24 @@ async def del_user(user: UserDeleDep):
     return user
 
 
-@app.get("/server")
-async def update_sever(server: ServerDep):
-    return server
+@app.get("/server", response_model=ServerPublicList)
+async def update_sever(server: ServerDep, response: Response):
+    return model_response(server, response)
+
+
+@app.get("/server/{server_name}", response_model=ServerPublic)
+async def server_status(server: ServerOneDep):
+    return model_response(server)
+
+
+@app.get("/fleet/summary")
+async def fleet_summary(summary: FleetSummaryDep) -> FleetSummary:
+    return summary
+
+
+@app.get("/fleet/top")
+async def fleet_top(top: FleetTopDep) -> FleetTop:
+    return top
 
 
 @app.post("/server_update")
@@ -97,16 +189,66 @@ async def update_server_account(server: ServerAccountUpdater):
     return server
 
 
+@app.post("/server_password_rotate", response_model=PasswordRotationResult)
+async def rotate_server_passwords(result: ServerPasswordRotator):
+    return model_response(result)
+
+
 @app.post("/server_create", response_model=ServerAccountPublic)
 async def create_user_server(server: ServerAccountCreater):
     return server
 
 
+@app.post("/server_import", response_model=ServerImportResult)
+async def import_servers(result: ServerImportDep):
+    return model_response(result)
+
+
+@app.get("/server_export")
+async def export_servers(export: ServerExportDep):
+    return export
+
+
 @app.delete("/server_delete", response_model=ServerAccountPublic)
 async def update_server_account(server: ServerAccountdel):
     return server
 
 
+@app.post("/task_run", response_model=FleetTaskResult)
+async def run_task(result: FleetTaskDep):
+    return model_response(result)
+
+
+@app.post("/command_run", response_model=FleetTaskResult)
+async def run_command(result: FleetCommandDep):
+    return model_response(result)
+
+
+@app.post("/account_create", response_model=AccountProvisionResult)
+async def create_accounts(result: AccountCreateDep):
+    return model_response(result)
+
+
+@app.post("/account_lock", response_model=AccountProvisionResult)
+async def lock_accounts(result: AccountLockDep):
+    return model_response(result)
+
+
+@app.get("/jobs", response_model=JobRunList)
+async def list_jobs(jobs: JobListDep):
+    return model_response(jobs)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job: JobDetailDep) -> JobRunDetail:
+    return job
+
+
+@app.get("/logs/{server_name}")
+async def follow_log(log: LogFollowDep):
+    return log
+
+
 @app.post("/emailrequest", response_model=EmailConfirmRequest)
 async def create_user_server(email: EmailConfirmDep):
     return email
@@ -117,8 +259,11 @@ async def create_user_server(email: EmailConfirmSMTPDep):
     return email
 
 
+IMPORT_TIME = time.perf_counter() - IMPORT_START
+
 # update ：uvicorn run config
 if __name__ == "__main__":
+    config = get_config()
     uvicorn.run(
         "main:app",  # 模块名:FastAPI 实例名
         host=config.server.host,  # 监听所有网络接口
@@ -0,0 +1,47 @@
+from typing import Dict, List, Literal
+from pydantic import BaseModel, Field
+
+
+#########################
+# MODELS
+#########################
+# one account to create or lock on every selected server
+class ProvisionAccount(BaseModel):
+    account: str = Field(pattern=r"^[a-z_][a-z0-9_-]{0,31}$")
+    # crypt(3) hash, e.g. from `openssl passwd -6`, "!" creates the account without a password
+    password_hash: str = Field(default="!", pattern=r"^\S+$")
+
+
+# accounts x hosts, all servers of the user when both tags and servers are empty
+class AccountProvisionRequest(BaseModel):
+    accounts: List[ProvisionAccount] = Field(min_length=1)
+    tags: List[str] | None = None
+    servers: List[str] | None = None
+    # run the command sets through sudo with the password of the server account
+    sudo: bool = True
+
+
+# accounts changed, already in the target state, or failed with the reason, on one host
+class HostProvisionResult(BaseModel):
+    job_id: str | None = None
+    server_name: str
+    server_ip: str
+    server_port: int = 22
+    success: bool
+    duration: float = 0.0
+    message: str | None = None
+    changed: List[str] = []
+    skipped: List[str] = []
+    failed: Dict[str, str] = {}
+
+
+class AccountProvisionResult(BaseModel):
+    batch_id: str
+    action: Literal["create", "lock"]
+    hosts_total: int
+    hosts_failed: int
+    changed: int
+    skipped: int
+    failed: int
+    duration: float
+    hosts: List[HostProvisionResult]
@@ -1,12 +1,31 @@
 import platform
-from typing import Dict, List
+from typing import Dict, List, Literal
 from pydantic import BaseModel
 
 
+# output parser of one command, fields are {field name: str | int | float | percent | bool}
+class PARSER(BaseModel):
+    type: Literal["regex", "columns", "csv", "kv", "json"]
+    fields: Dict[str, str]
+    pattern: str | None = None  # regex parser
+    separator: str | None = None  # columns, csv and kv parsers
+    rows: bool = False  # one record per line, stored as a list
+    into: str | None = None  # field name of the row list, the command name by default
+    exclude: str | None = None  # regex of lines to drop
+
+
 # TODO : Combine CMDS and INTER_CMDS Together
 class CMDS(BaseModel):
+    name: str | None = None
     platform: str
     cmds: Dict[str, str]
     activate: bool
     sequence : Dict[str, str] | None = None
-    flag: Dict[str, str] |  None = None
\ No newline at end of file
+    flag: Dict[str, str] |  None = None
+    # static commands and their cache ttl in seconds, commands not listed run on every call
+    ttl: Dict[str, int] | None = None
+    parsers: Dict[str, PARSER] | None = None
+    # characters of output kept in memory per command, head and tail, overrides ssh.output_head/output_tail
+    output: Dict[str, int] | None = None
+    # seconds per command, overrides ssh.command_timeout, the request deadline still applies
+    timeout: Dict[str, float] | None = None
@@ -1,4 +1,6 @@
-from pydantic import BaseModel, ValidationError
+import os
+from typing import Dict, List, Literal
+from pydantic import BaseModel, ValidationError, model_validator
 
 
 class ServerSettings(BaseModel):
@@ -8,6 +10,9 @@ class ServerSettings(BaseModel):
     log_level: str
     log_dir: str
     admin_email: str
+    compress_min_size: int = 1024  # responses smaller than this are not compressed
+    gzip_level: int = 6
+    brotli_quality: int = 4  # used when the brotli package is installed
 
 
 # Database settings
@@ -17,7 +22,80 @@ class DatabaseSettings(BaseModel):
     thread: bool
 
 
+# SSH transport tuning, applied when a connection is opened
+class TransportProfile(BaseModel):
+    compress: bool = False  # zlib, pays off on slow links when the server supports it
+    ciphers: List[str] = []  # tried first, in this order, paramiko's defaults follow
+    kex: List[str] = []
+    macs: List[str] = []
+    window_size: int | None = None  # channel window in bytes, paramiko default 2 MiB
+    max_packet_size: int | None = None  # paramiko default 32 KiB
+    keepalive: int = 0  # seconds between keepalive packets, 0 disables
+
+
+# SSH settings
+class SSHSettings(BaseModel):
+    connect_timeout: float = 5
+    breaker_threshold: int = 3  # connection failures before a host is marked down
+    breaker_backoff: float = 30  # first backoff window in seconds, doubled on every failed probe
+    breaker_max_backoff: float = 600
+    probe_interval: float = 10
+    max_active: int = 32  # ssh operations running at once
+    reserved_interactive: int = 4  # slots only interactive requests may use
+    queue_limits: Dict[str, int] = {"interactive": 64, "task": 512, "poll": 256}  # waiting operations per class
+    queue_timeout: float = 30  # longest wait for a slot before the work is shed
+    retry_after: int = 5  # Retry-After of shed requests
+    output_head: int = 65536  # characters of command output kept from the start
+    output_tail: int = 65536  # characters of command output kept from the end
+    output_spool: int = 262144  # output held in memory before spilling to a temp file
+    output_spool_limit: int = 67108864  # output spooled at most per stream, 0 disables spooling
+    command_timeout: float = 10  # seconds per command unless cmds.yaml sets its own
+    request_timeout: float = 120  # seconds of ssh work per api request, 0 for none
+    prewarm: bool = False  # open the connections of all server accounts in the background at startup
+    prewarm_concurrency: int = 16  # connections opened at once by the pre-warm
+    transport_profiles: Dict[str, TransportProfile] = {}  # named transport tunings
+    transport_profile: str | None = None  # profile of hosts matching no pattern, paramiko defaults otherwise
+    transport_hosts: Dict[str, str] = {}  # glob of the server ip or ip:port -> profile name, first match wins
+
+    @model_validator(mode="after")
+    def check_transport_profiles(self):
+        names = list(self.transport_hosts.values()) + ([self.transport_profile] if self.transport_profile else [])
+        unknown = set(names) - set(self.transport_profiles)
+        if unknown:
+            raise ValueError(f"unknown transport profiles: {sorted(unknown)}")
+        return self
+
+
+# Job settings
+class JobSettings(BaseModel):
+    backend: Literal["thread", "process"] = "thread"
+    workers: int = os.cpu_count() or 1  # worker processes of the process backend
+    worker_concurrency: int = 16  # jobs running at once in one worker process
+    max_concurrency: int = 32
+    per_host_concurrency: int = 2
+    history_batch_size: int = 200
+    history_flush_interval: int = 5  # seconds
+    history_output_limit: int = 4096  # chars kept of stdout / stderr
+    history_retention_days: int = 30
+    history_buffer_limit: int = 10000  # rows kept for the next flush while the database fails
+
+
+# Background status polling
+class PollerSettings(BaseModel):
+    enabled: bool = False
+    interval: float = 60  # base poll interval in seconds
+    min_interval: float = 15  # hosts close to a threshold
+    max_interval: float = 600  # stable or unreachable hosts
+    backoff: float = 2.0
+    jitter: float = 0.1  # fraction of the interval
+    stable_delta: float = 2.0  # cpu / memory usage change in percent
+    hot_threshold: float = 90.0  # usage in percent
+
+
 # main model
 class Config(BaseModel):
     server: ServerSettings
     database: DatabaseSettings
+    ssh: SSHSettings = SSHSettings()
+    job: JobSettings = JobSettings()
+    poller: PollerSettings = PollerSettings()
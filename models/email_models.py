@@ -42,4 +42,12 @@ class EmailVerificationCodeTotp:
         return self.totp
 
 
-TOTP = EmailVerificationCodeTotp().get_totp()
+# the secret is created on first use, codes are valid in this process only
+TOTP: pyotp.TOTP | None = None
+
+
+def get_totp() -> pyotp.TOTP:
+    global TOTP
+    if TOTP is None:
+        TOTP = EmailVerificationCodeTotp().get_totp()
+    return TOTP
@@ -0,0 +1,65 @@
+from datetime import datetime
+from typing import List
+from uuid import uuid4
+from pydantic import BaseModel
+from sqlalchemy import Index
+from sqlmodel import Field, SQLModel
+
+
+#########################
+# MODELS
+#########################
+class JobRunBase(SQLModel):
+    id: str = Field(default_factory=lambda: uuid4().hex, primary_key=True)
+    batch_id: str | None = Field(default=None, index=True)  # shared by the hosts of one fleet run
+    task_name: str = Field(index=True)
+    username: str | None = Field(default=None)
+    server_name: str | None = Field(default=None)
+    server_ip: str = Field(index=True)
+    server_port: int = Field(default=22)
+    status: str = Field(index=True)  # success / failed
+    message: str | None = Field(default=None)
+    started_at: datetime = Field(index=True)
+    finished_at: datetime
+    duration: float = Field(default=0.0)
+
+
+class JobRunDB(JobRunBase, table=True):
+    __table_args__ = (Index("ix_jobrundb_username_started_at", "username", "started_at"),)
+
+
+class JobCommandBase(SQLModel):
+    id: str = Field(default_factory=lambda: uuid4().hex, primary_key=True)
+    job_id: str = Field(foreign_key="jobrundb.id", index=True)
+    step: str
+    command_name: str
+    command: str = Field(default="")
+    host: str = Field(index=True)
+    exit_code: int | None = Field(default=None)
+    ok: bool = Field(default=False)
+    stdout: str = Field(default="")  # truncated
+    stderr: str = Field(default="")  # truncated
+    duration: float | None = Field(default=None)
+
+
+class JobCommandDB(JobCommandBase, table=True):
+    pass
+
+
+class JobRunPublic(JobRunBase):
+    pass
+
+
+class JobCommandPublic(JobCommandBase):
+    pass
+
+
+class JobRunDetail(JobRunPublic):
+    commands: List[JobCommandPublic] = []
+
+
+class JobRunList(BaseModel):
+    total: int
+    limit: int
+    offset: int
+    jobs: List[JobRunPublic]
@@ -1,7 +1,8 @@
 from datetime import datetime
-from typing import List
+from typing import Any, Dict, List
 from pydantic import BaseModel
 from sqlmodel import Field, SQLModel
+from models.tasks_models import HostTaskResult
 
 
 #########################
@@ -42,11 +43,69 @@ class ServerPublic(BaseModel):
     memory_total: str | None = None
     memory_used: str | None = None
     memory_usage: float | None = None
-    last_updated: datetime | None = None
+    last_updated: datetime | None = None  # time of the last change
+    metrics: Dict[str, Any] | None = None  # parsed fields without a dedicated attribute
+    errors: Dict[str, str] | None = None  # fields that could not be parsed
+    version: int | None = None  # snapshot version, increases on every change
 
 
 class ServerPublicList(BaseModel):
     servers: List[ServerPublic]
+    version: int | None = None  # newest snapshot version, use as ?since= of the next poll
+
+
+class ServerFailure(BaseModel):
+    server_name: str
+    server_ip: str
+    message: str | None = None
+
+
+class ServerStreamSummary(BaseModel):
+    total: int
+    succeeded: int
+    failed: List[ServerFailure]
+    duration: float
+
+
+class MetricStats(BaseModel):
+    count: int
+    min: float | None = None
+    max: float | None = None
+    mean: float | None = None
+    p50: float | None = None
+    p90: float | None = None
+    p99: float | None = None
+
+
+class GPUEntry(BaseModel):
+    server_name: str | None = None
+    server_ip: str | None = None
+    index: int
+    model: str
+    usage: float
+
+
+class FleetSummary(BaseModel):
+    hosts: int  # registered servers
+    reporting: int  # servers with a cached snapshot
+    unreachable: int  # servers with an open circuit
+    gpus: int
+    metrics: Dict[str, MetricStats]
+    idle_gpus: List[GPUEntry]
+    oldest_snapshot: datetime | None = None
+
+
+class FleetTopEntry(BaseModel):
+    server_name: str | None = None
+    server_ip: str | None = None
+    label: str | None = None  # disk mount point or gpu index
+    value: float
+
+
+class FleetTop(BaseModel):
+    metric: str
+    order: str
+    entries: List[FleetTopEntry]
 
 
 class ServerAccountBase(SQLModel):
@@ -55,6 +114,8 @@ class ServerAccountBase(SQLModel):
     account_name: str = Field()
     server_ip: str = Field()
     server_port: int = Field(default=22)
+    tags: str | None = Field(default=None)  # comma separated, e.g. "gpu,lab-a"
+    gateway: str | None = Field(default=None)  # server_name of the login node to jump through
 
 
 class ServerAccountDB(ServerAccountBase, table=True):
@@ -68,3 +129,65 @@ class ServerAccountUpdate(ServerAccountBase):
 
 class ServerAccountPublic(ServerAccountBase):
     account_password: str = Field()
+
+
+# one rejected row of a server account import, row numbers start at 1 after the csv header
+class ServerImportError(BaseModel):
+    row: int
+    server_name: str | None = None
+    message: str
+
+
+class ServerImportResult(BaseModel):
+    total: int
+    imported: int
+    failed: int
+    duration: float
+    errors: List[ServerImportError]
+
+
+# one new password for every selected server account, all servers of the user by default
+class PasswordRotationRequest(BaseModel):
+    account_password_new: str
+    servers: List[str] | None = None
+    tags: List[str] | None = None
+
+
+# per host outcome of a rotation, hosts already on the new password are skipped,
+# sending the same request again only retries the failed hosts
+class PasswordRotationResult(BaseModel):
+    total: int
+    succeeded: int
+    skipped: int
+    failed: int
+    duration: float
+    hosts: List[HostTaskResult]
+    retry_servers: List[str]
+
+
+# progress of the background connection pre-warm after a restart
+class PrewarmStatus(BaseModel):
+    enabled: bool = False
+    total: int = 0  # distinct connections to open
+    opened: int = 0
+    failed: int = 0
+    finished: bool = False
+    duration: float | None = None
+
+
+# answered once startup is done, the pre-warm goes on in the background
+class ReadinessStatus(BaseModel):
+    ready: bool
+    startup: Dict[str, float]  # seconds per startup phase, imports included
+    connections: int  # pooled ssh connections
+    prewarm: PrewarmStatus
+
+
+# cached output of a static command, e.g. hostname or cpu model
+class HostFactDB(SQLModel, table=True):
+    host_key: str = Field(primary_key=True)  # ssh connection key
+    name: str = Field(primary_key=True)  # command name in cmds.yaml
+    command: str = Field(default="")
+    stdout: str = Field(default="")
+    fetched_at: datetime = Field()
+    expires_at: datetime = Field(index=True)
@@ -1,12 +1,105 @@
 import platform
-from typing import Dict, List
-from pydantic import BaseModel
+from typing import Dict, List, Literal
+from pydantic import BaseModel, Field, model_validator
 from models.cmds_models import CMDS
 
+
+# one step of a task, runs after all steps listed in after
+class TASK_STEP(BaseModel):
+    name: str
+    after: List[str] = []
+    cmds: CMDS
+
+
 # task group to deal with a series of cmds
 class TASK(BaseModel):
     platform: str
     cycle: str
     trigger: str
-    tasks: List[CMDS]
-    activate: bool
\ No newline at end of file
+    tasks: List[TASK_STEP]
+    # fail_fast cancels the remaining steps on the first failure,
+    # continue still runs every step whose dependencies succeeded
+    policy: Literal["fail_fast", "continue"] = "continue"
+    activate: bool
+
+    @model_validator(mode="after")
+    def check_steps(self):
+        names = [step.name for step in self.tasks]
+        if len(names) != len(set(names)):
+            raise ValueError(f"duplicate steps in task: {names}")
+
+        for step in self.tasks:
+            unknown = set(step.after) - set(names)
+            if unknown:
+                raise ValueError(f"step {step.name} runs after unknown steps: {sorted(unknown)}")
+
+        # Kahn's algorithm, every step must be reachable without a cycle
+        remaining = {step.name: set(step.after) for step in self.tasks}
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"dependency cycle between steps: {sorted(remaining)}")
+            for name in ready:
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+        return self
+
+
+# result of one remote command
+class CommandResult(BaseModel):
+    command: str = ""
+    exit_code: int | None = None
+    ok: bool = False
+    stdout: str = ""
+    stderr: str = ""
+    duration: float | None = None
+
+
+# result of one task on one host, results are {step name: {command name: result}}
+class HostTaskResult(BaseModel):
+    job_id: str | None = None
+    server_name: str
+    server_ip: str
+    server_port: int = 22
+    success: bool
+    duration: float = 0.0
+    message: str | None = None
+    results: Dict[str, Dict[str, CommandResult]] = {}
+
+
+# host selector, all servers of the user when both tags and servers are empty
+class FleetTaskRequest(BaseModel):
+    task_name: str
+    tags: List[str] | None = None
+    servers: List[str] | None = None
+
+
+# batch command, a cmds.yaml set by name or one ad-hoc command (admins only),
+# sudo runs every command through sudo with the password of the server account
+class FleetCommandRequest(BaseModel):
+    cmds_name: str | None = None
+    command: str | None = None
+    sudo: bool = False
+    # seconds per command, overrides the timeouts of cmds.yaml and ssh.command_timeout
+    timeout: float | None = Field(default=None, gt=0)
+    tags: List[str] | None = None
+    servers: List[str] | None = None
+
+    @model_validator(mode="after")
+    def check_command(self):
+        if (self.cmds_name is None) == (self.command is None):
+            raise ValueError("give either cmds_name or command")
+        if self.command is not None and not self.command.strip():
+            raise ValueError("command is empty")
+        return self
+
+
+class FleetTaskResult(BaseModel):
+    batch_id: str | None = None
+    task_name: str
+    total: int
+    succeeded: int
+    failed: int
+    duration: float
+    hosts: List[HostTaskResult]
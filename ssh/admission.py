@@ -0,0 +1,134 @@
+"""Admission control for SSH work.
+
+Every ssh operation (connect, command) takes a slot before it runs. Waiting work is
+queued per priority class and a free slot always goes to the highest class first, a
+few slots are reserved for interactive work only. When the queue of a class is full,
+or a waiter can't get a slot in time, the work is shed with 503 and Retry-After.
+
+The class of the running work is kept in a context variable, so callers mark it once
+(poller, task runner) and everything below inherits it.
+"""
+
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict
+from fastapi import HTTPException
+from starlette import status
+from logger import get_logger
+from models.config_models import SSHSettings
+from ssh.deadline import bounded, check_deadline, deadline_exception
+
+logger = get_logger("main.admission")
+
+# highest priority first
+PRIORITIES = ("interactive", "task", "poll")
+
+ssh_priority: ContextVar[str] = ContextVar("ssh_priority", default="interactive")
+
+
+class AdmissionController:
+    """bounded ssh concurrency with strict priority between classes"""
+
+    def __init__(self, settings: SSHSettings):
+        self.max_active = settings.max_active
+        self.reserved = min(settings.reserved_interactive, settings.max_active - 1)
+        self.queue_limits = settings.queue_limits
+        self.queue_timeout = settings.queue_timeout
+        self.active = 0
+        self.waiters: Dict[str, Deque[asyncio.Future]] = {priority: deque() for priority in PRIORITIES}
+        self.shed: Dict[str, int] = {priority: 0 for priority in PRIORITIES}
+        self.busy_exception = HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="ssh work queue is full, retry later",
+            headers={"Retry-After": str(settings.retry_after)},
+        )
+
+    def limit(self, priority: str) -> int:
+        return self.max_active if priority == "interactive" else self.max_active - self.reserved
+
+    def can_start(self, priority: str) -> bool:
+        """a free slot and nobody of the same or a higher class waiting for it"""
+        if self.active >= self.limit(priority):
+            return False
+        higher = PRIORITIES[:PRIORITIES.index(priority) + 1]
+        return not any(self.waiters[waiting] for waiting in higher)
+
+    async def acquire(self, priority: str | None = None):
+        """
+        Take a slot for one ssh operation.
+
+        Args:
+            priority: class of the work, the current ssh_priority when not given
+
+        Raises:
+            HTTPException: 503 with Retry-After when the work is shed, 504 when the
+                request deadline passes first
+        """
+        priority = priority or ssh_priority.get()
+        check_deadline()
+        if self.can_start(priority):
+            self.active += 1
+            return
+
+        queue = self.waiters[priority]
+        if len(queue) >= self.queue_limits.get(priority, 0):
+            self.shed[priority] += 1
+            logger.warning(f"Shedding {priority} ssh work, {len(queue)} waiting and {self.active} running")
+            raise self.busy_exception
+
+        waiter = asyncio.get_running_loop().create_future()
+        queue.append(waiter)
+        # the request deadline may come before the queue timeout
+        timeout = bounded(self.queue_timeout)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            if timeout < self.queue_timeout:
+                raise deadline_exception
+            self.shed[priority] += 1
+            logger.warning(f"Shedding {priority} ssh work after waiting {self.queue_timeout}s")
+            raise self.busy_exception
+        except asyncio.CancelledError:
+            # the slot may have been handed over right before the cancellation
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in queue:
+                queue.remove(waiter)
+
+    def release(self):
+        self.active -= 1
+        self.wake()
+
+    def wake(self):
+        """hand free slots to the waiters, highest class first"""
+        for priority in PRIORITIES:
+            queue = self.waiters[priority]
+            while queue and self.active < self.limit(priority):
+                waiter = queue.popleft()
+                if waiter.done():
+                    continue
+                self.active += 1
+                waiter.set_result(True)
+            if queue:
+                # lower classes never overtake a waiting higher class
+                return
+
+    @asynccontextmanager
+    async def slot(self, priority: str | None = None):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+def is_busy(e: Exception) -> bool:
+    """503 and 504 answers (shed work, open circuit, request deadline) are passed to the client as they are"""
+    return isinstance(e, HTTPException) and e.status_code in (status.HTTP_503_SERVICE_UNAVAILABLE,
+                                                              status.HTTP_504_GATEWAY_TIMEOUT)
@@ -0,0 +1,115 @@
+"""Request deadlines for SSH work.
+
+An api request gets a deadline when it comes in, ssh.request_timeout seconds from now
+or less when the client asks for it in the X-Request-Timeout header. The deadline is kept in
+a context variable like the admission class, so everything the request starts
+inherits it: waiting for an admission slot, the handshake of a new connection and the
+timeout of every command are cut to the time left. Once it has passed no new command
+is started and execute_commands returns what it has, the channel of a running command
+is closed by its timeout.
+
+Background work (poller, scheduled jobs, shared log tails) runs without a deadline.
+"""
+
+import math
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator
+from fastapi import HTTPException
+from starlette import status
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+# time.monotonic() the ssh work of the current request has to be done by, None for no deadline
+request_deadline: ContextVar[float | None] = ContextVar("request_deadline", default=None)
+
+TIMEOUT_HEADER = "x-request-timeout"
+
+deadline_exception = HTTPException(
+    status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+    detail="request deadline exceeded",
+)
+
+
+def remaining() -> float | None:
+    """seconds left until the deadline, None without a deadline"""
+    deadline = request_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def bounded(timeout: float | None) -> float | None:
+    """a timeout cut to the time left, None waits as long as the deadline allows"""
+    left = remaining()
+    if left is None:
+        return timeout
+    left = max(left, 0.0)
+    return left if timeout is None else min(timeout, left)
+
+
+def check_deadline():
+    """
+    Raises:
+        HTTPException: 504 when the deadline has passed
+    """
+    if expired():
+        raise deadline_exception
+
+
+def is_deadline(e: Exception) -> bool:
+    return e is deadline_exception
+
+
+@contextmanager
+def deadline(seconds: float | None) -> Iterator[None]:
+    """run the block with a deadline seconds from now, None or 0 lifts it"""
+    token = request_deadline.set(time.monotonic() + seconds if seconds else None)
+    try:
+        yield
+    finally:
+        request_deadline.reset(token)
+
+
+class DeadlineMiddleware:
+    """
+    Give every http request a deadline for its ssh work.
+
+    Args:
+        app: ASGI application
+        timeout: Default seconds of a request, 0 for none, called on the first request
+            so the settings can be loaded at startup
+    """
+
+    def __init__(self, app: ASGIApp, timeout: Callable[[], float]) -> None:
+        self.app = app
+        self.timeout = timeout
+        self.default: float | None = None
+
+    def request_timeout(self, scope: Scope) -> float:
+        """
+        seconds asked for by the client, the default when missing or invalid, a client
+        can shorten the default deadline but neither lift nor extend it
+        """
+        if self.default is None:
+            self.default = self.timeout()
+        try:
+            seconds = float(Headers(scope=scope).get(TIMEOUT_HEADER))
+        except (TypeError, ValueError):
+            seconds = -1.0
+        if not math.isfinite(seconds) or seconds < 0:
+            return self.default
+        if self.default > 0:
+            return min(seconds, self.default) if seconds > 0 else self.default
+        return seconds
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with deadline(self.request_timeout(scope)):
+            await self.app(scope, receive, send)
@@ -0,0 +1,125 @@
+"""Gateway (ProxyJump) routes of server accounts.
+
+A server account can name another server account of the same user as its gateway,
+usually the login node of a cluster. The connection manager opens the gateway like any
+other pooled connection and tunnels a direct-tcpip channel through its transport for
+every host behind it, so one login node carries the connections of all its nodes.
+
+The route of a host is part of its identity: private addresses repeat from site to
+site, 10.0.0.5 behind one login node is not 10.0.0.5 behind another. Routes are only
+followed through the server accounts of the account's own user.
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+from fastapi import HTTPException
+from sqlmodel import Session, select
+from starlette import status
+from database.db import get_engine
+from logger import get_logger
+from models.server_models import ServerAccountDB
+
+logger = get_logger("main.gateway")
+
+gateway_exception = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail="gateway server not found",
+)
+
+gateway_loop_exception = HTTPException(
+    status_code=status.HTTP_400_BAD_REQUEST,
+    detail="gateway servers form a loop",
+)
+
+
+@dataclass(frozen=True)
+class Hop:
+    """login of one gateway on the way to a host"""
+    ip: str
+    port: int
+    username: str
+    password: str = field(repr=False)
+
+
+# gateways a host is reached through, nearest first, empty for a direct connection
+Route = Tuple[Hop, ...]
+
+
+def check_gateway(servers: Dict[str, ServerAccountDB], server_name: str, gateway: str | None) -> Route:
+    """
+    Follow the gateway chain of a server, before it is saved too.
+
+    Args:
+        servers: Server accounts of the user by server name
+        server_name: Server the gateway is set on
+        gateway: Server name of the gateway, None for a direct connection
+
+    Returns:
+        The gateways to go through, nearest first, empty for a direct connection
+
+    Raises:
+        HTTPException: 400 when a gateway doesn't exist or the chain loops
+    """
+    seen = {server_name}
+    route: List[Hop] = []
+    while gateway is not None:
+        if gateway in seen:
+            raise gateway_loop_exception
+        seen.add(gateway)
+        hop = servers.get(gateway)
+        if hop is None:
+            raise gateway_exception
+        route.append(Hop(hop.server_ip, hop.server_port, hop.account_name, hop.account_password))
+        gateway = hop.gateway
+    return tuple(route)
+
+
+def owner_servers(username: str) -> Dict[str, ServerAccountDB]:
+    """server accounts of a user by server name"""
+    with Session(get_engine()) as session:
+        servers = session.exec(select(ServerAccountDB).where(ServerAccountDB.username == username)).all()
+    return {server.server_name: server for server in servers}
+
+
+def account_route(account: ServerAccountDB, servers: Dict[str, ServerAccountDB] | None = None) -> Route:
+    """
+    Route of a saved server account.
+
+    Args:
+        account: Server account
+        servers: Server accounts of its user by server name, read from the database when None
+
+    Raises:
+        HTTPException: 400 when a gateway doesn't exist or the chain loops
+    """
+    if account.gateway is None:
+        return ()
+    if servers is None:
+        servers = owner_servers(account.username)
+    return check_gateway(servers, account.server_name, account.gateway)
+
+
+async def resolve_route(account: ServerAccountDB) -> Route:
+    """account_route off the event loop, a direct account doesn't read the database"""
+    if account.gateway is None:
+        return ()
+    return await asyncio.to_thread(account_route, account)
+
+
+def fleet_routes(accounts: List[ServerAccountDB]) -> Dict[Tuple[str, str], Route]:
+    """
+    Routes of every server account of all users, keyed by user and server name.
+
+    Accounts whose gateway chain is broken are logged and left out.
+    """
+    servers: Dict[str, Dict[str, ServerAccountDB]] = {}
+    for account in accounts:
+        servers.setdefault(account.username, {})[account.server_name] = account
+    routes = {}
+    for account in accounts:
+        try:
+            routes[(account.username, account.server_name)] = account_route(account, servers[account.username])
+        except HTTPException as e:
+            logger.warning(f"Skipping {account.server_name} of {account.username}: {e.detail}")
+    return routes
@@ -0,0 +1,214 @@
+"""Bounded handling of remote command output.
+
+Fabric keeps the complete stdout/stderr of a command in memory. BoundedRemote is a
+drop-in runner for Connection.run that keeps only the head and the tail of each stream
+in memory and spools the whole stream to a temporary file past a threshold, so memory
+stays flat whatever the remote command prints. The spooled output can be read back
+with iter_output, and CommandStream reads the output of a running command chunk by
+chunk without buffering it at all.
+"""
+
+import asyncio
+import codecs
+import shlex
+import tempfile
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import AsyncIterator, Deque, Iterator, List
+from fabric import Connection
+from fabric.runners import Remote
+
+
+@dataclass
+class OutputLimits:
+    head: int = 65536  # characters kept from the start of a stream
+    tail: int = 65536  # characters kept from the end of a stream
+    spool: int = 262144  # characters held in memory before the spool moves to a temp file
+    spool_limit: int = 67108864  # characters spooled at most, 0 disables spooling
+
+    def retained(self, size: int) -> "OutputLimits":
+        """limits keeping size characters, split over head and tail"""
+        return OutputLimits(head=size // 2, tail=size - size // 2, spool=self.spool, spool_limit=self.spool_limit)
+
+
+# limits of the commands run in the current context
+output_limits: ContextVar[OutputLimits] = ContextVar("output_limits", default=OutputLimits())
+
+
+class BoundedOutput:
+    """head and tail of one output stream, the whole stream spooled to a temp file"""
+
+    def __init__(self, limits: OutputLimits):
+        self.limits = limits
+        self.head: List[str] = []
+        self.head_size = 0
+        self.tail: Deque[str] = deque()
+        self.tail_size = 0
+        self.size = 0
+        self.spooled = 0
+        self.spool = tempfile.SpooledTemporaryFile(max_size=limits.spool, mode="w+", encoding="utf-8") \
+            if limits.spool_limit else None
+
+    def append(self, data: str):
+        self.size += len(data)
+        if self.spool is not None and self.spooled < self.limits.spool_limit:
+            part = data[:self.limits.spool_limit - self.spooled]
+            self.spool.write(part)
+            self.spooled += len(part)
+
+        if self.head_size < self.limits.head:
+            part = data[:self.limits.head - self.head_size]
+            self.head.append(part)
+            self.head_size += len(part)
+            data = data[len(part):]
+        if not data or not self.limits.tail:
+            return
+
+        self.tail.append(data)
+        self.tail_size += len(data)
+        while self.tail and self.tail_size - len(self.tail[0]) >= self.limits.tail:
+            self.tail_size -= len(self.tail.popleft())
+
+    @property
+    def truncated(self) -> int:
+        """characters dropped between head and tail"""
+        return max(0, self.size - self.head_size - min(self.tail_size, self.limits.tail))
+
+    @property
+    def complete(self) -> bool:
+        """the spool holds the whole stream"""
+        return self.spool is not None and self.spooled == self.size
+
+    def __iter__(self) -> Iterator[str]:
+        """retained text, used by invoke to build Result.stdout and Result.stderr"""
+        yield from self.head
+        if self.truncated:
+            yield f"\n... {self.truncated} characters truncated ...\n"
+        if self.tail:
+            yield "".join(self.tail)[-self.limits.tail:]
+
+    def chunks(self, size: int = 65536) -> Iterator[str]:
+        """the spooled stream from the start, or the retained text without a spool"""
+        if self.spool is None:
+            yield from self
+            return
+        self.spool.seek(0)
+        while True:
+            chunk = self.spool.read(size)
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self):
+        if self.spool is not None:
+            self.spool.close()
+
+
+class BoundedRemote(Remote):
+    """fabric runner capturing output in BoundedOutput buffers"""
+
+    def create_io_threads(self):
+        threads, _, _ = super().create_io_threads()
+        limits = output_limits.get()
+        stdout, stderr = BoundedOutput(limits), BoundedOutput(limits)
+        # point the io threads at the bounded buffers
+        for target, thread in threads.items():
+            if target == self.handle_stdout:
+                thread.kwargs["kwargs"]["buffer_"] = stdout
+            elif target == self.handle_stderr:
+                thread.kwargs["kwargs"]["buffer_"] = stderr
+        return threads, stdout, stderr
+
+    def respond(self, buffer_):
+        # watchers need the joined buffer, don't build it for nothing on every chunk
+        if self.watchers:
+            super().respond(buffer_)
+
+    def generate_result(self, **kwargs):
+        result = super().generate_result(**kwargs)
+        if isinstance(self.stdout, BoundedOutput):
+            result.stdout_buffer = self.stdout
+            result.stderr_buffer = self.stderr
+            result.truncated = self.stdout.truncated + self.stderr.truncated
+        return result
+
+
+async def iter_output(buffer: BoundedOutput, size: int = 65536) -> AsyncIterator[str]:
+    """read a spooled stream without blocking the event loop"""
+    chunks = buffer.chunks(size)
+    while True:
+        chunk = await asyncio.to_thread(next, chunks, None)
+        if chunk is None:
+            break
+        yield chunk
+
+
+class CommandStream:
+    """
+    Live output of one remote command, read chunk by chunk.
+
+    Nothing is read ahead of the consumer, a slow consumer fills the ssh window and
+    pauses the remote command. Closing the stream closes the channel, use it as an
+    async context manager when the consumer may stop early.
+
+    Args:
+        connection: open fabric connection
+        command: shell command
+        chunk_size: bytes read at once
+        timeout: seconds without output before socket.timeout is raised, None waits forever
+        combine_stderr: interleave stderr with stdout
+    """
+
+    def __init__(self, connection: Connection, command: str, chunk_size: int = 32768,
+                 timeout: float | None = None, combine_stderr: bool = True):
+        self.connection = connection
+        self.command = command
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.combine_stderr = combine_stderr
+        self.channel = None
+        self.exited: int | None = None
+
+    def open(self):
+        self.connection.open()
+        env = self.connection.config.run.env
+        command = self.command
+        if env:
+            command = "export {} && {}".format(
+                " ".join(f"{key}={shlex.quote(value)}" for key, value in sorted(env.items())), command)
+        channel = self.connection.create_session()
+        channel.set_combine_stderr(self.combine_stderr)
+        channel.settimeout(self.timeout)
+        channel.exec_command(command)
+        self.channel = channel
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        if self.channel is None:
+            await asyncio.to_thread(self.open)
+        decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        try:
+            while True:
+                data = await asyncio.to_thread(self.channel.recv, self.chunk_size)
+                if not data:
+                    break
+                text = decoder.decode(data)
+                if text:
+                    yield text
+            text = decoder.decode(b"", final=True)
+            if text:
+                yield text
+            self.exited = await asyncio.to_thread(self.channel.recv_exit_status)
+        finally:
+            self.close()
+
+    async def __aenter__(self) -> "CommandStream":
+        return self
+
+    async def __aexit__(self, *exc):
+        # an abandoned async for doesn't finalize the generator right away
+        self.close()
+
+    def close(self):
+        if self.channel is not None:
+            self.channel.close()
@@ -1,8 +1,20 @@
-from typing import Dict, Annotated
+from typing import Dict, Annotated, List
 from fastapi import Depends, HTTPException
 import asyncio
+import io
+import socket
+import time
 from fabric import Connection, Result
+from invoke import StreamWatcher
+from paramiko import AuthenticationException, Transport
+from envset.config import get_config
 from logger import get_logger
+from models.config_models import SSHSettings
+from ssh.admission import AdmissionController
+from ssh.deadline import bounded, deadline_exception, expired, is_deadline
+from ssh.gateway import Route
+from ssh.output import BoundedRemote, OutputLimits, output_limits
+from ssh.transport import host_profile, transport_kwargs
 from types import SimpleNamespace
 from starlette import status
 
@@ -23,19 +35,172 @@ ssh_create_exception = HTTPException(
     detail="ssh failed create connection",
 )
 
+ssh_circuit_open_exception = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="host is unreachable, retry later",
+)
+
 # logger for ssh
 logger = get_logger("main.ssh")
 
 
+class CircuitBreaker:
+    """per host breaker, an open host fails fast until its backoff window is over"""
+
+    def __init__(self, threshold: int, backoff: float, max_backoff: float):
+        self.threshold = threshold
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failures = 0
+        self.window = backoff
+        self.opened = False
+        self.opened_until = 0.0
+
+    def allow(self) -> bool:
+        """closed, or open with an expired window (half-open)"""
+        return not self.opened or time.monotonic() >= self.opened_until
+
+    def record_success(self):
+        self.failures = 0
+        self.window = self.backoff
+        self.opened = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.opened:
+            # half-open try failed, wait longer
+            self.window = min(self.window * 2, self.max_backoff)
+            self.opened_until = time.monotonic() + self.window
+        elif self.failures >= self.threshold:
+            self.opened = True
+            self.opened_until = time.monotonic() + self.window
+            logger.warning(f"Circuit opened after {self.failures} failures, backing off {self.window}s")
+
+
+def probe_host(ip: str, port: int, timeout: float) -> bool:
+    """cheap reachability check, tcp connect and ssh banner without authentication"""
+    try:
+        with socket.create_connection((ip, port), timeout=timeout) as sock:
+            sock.settimeout(timeout)
+            return sock.recv(4).startswith(b"SSH-")
+    except OSError:
+        return False
+
+
+def probe_through(transport: Transport, ip: str, port: int, timeout: float) -> bool:
+    """the same check for a host behind a gateway, over a channel of the gateway transport"""
+    try:
+        channel = transport.open_channel("direct-tcpip", (ip, port), ("", 0), timeout=timeout)
+    except Exception:
+        return False
+    try:
+        channel.settimeout(timeout)
+        return channel.recv(4).startswith(b"SSH-")
+    except OSError:
+        return False
+    finally:
+        channel.close()
+
+
 # ssh connection pool
 class SSHConnectionManager:
-    def __init__(self):
+    def __init__(self, settings: SSHSettings):
+        self.settings = settings
         self.connections: Dict[str, Connection] = {}
         self.locks: Dict[str, asyncio.Lock] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        # times a dead pooled connection was replaced, the host may have rebooted
+        self.reconnects: Dict[str, int] = {}
+        # host key -> route of the hosts behind gateways
+        self.routes: Dict[str, Route] = {}
+        self.admission = AdmissionController(settings)
+        self.output_limits = OutputLimits(head=settings.output_head,
+                                          tail=settings.output_tail,
+                                          spool=settings.output_spool,
+                                          spool_limit=settings.output_spool_limit)
+
+    def breaker(self, ip: str, port=22, route: Route = ()) -> CircuitBreaker:
+        host_key = self.host_key(ip, port, route)
+        if host_key not in self.breakers:
+            self.breakers[host_key] = CircuitBreaker(self.settings.breaker_threshold,
+                                                     self.settings.breaker_backoff,
+                                                     self.settings.breaker_max_backoff)
+            if route:
+                self.routes[host_key] = route
+        return self.breakers[host_key]
+
+    def reconnect_count(self, ip: str, username: str, port=22, route: Route = ()) -> int:
+        return self.reconnects.get(self.connection_key(ip, username, port, route), 0)
+
+    def is_open(self, ip: str, port=22, route: Route = ()) -> bool:
+        return not self.breaker(ip, port, route).allow()
+
+    async def probe_open_hosts(self):
+        """half-open probes, close the breaker of every host answering again"""
+        for host_key, breaker in list(self.breakers.items()):
+            if not breaker.opened or not breaker.allow():
+                continue
+            ip, port = host_key.partition(" via ")[0].rsplit(":", 1)
+            route = self.routes.get(host_key)
+            if route:
+                # hosts behind a gateway are only reachable through its transport
+                transport = self.active_transport(self.connection_key(route[0].ip, route[0].username,
+                                                                      route[0].port, route[1:]))
+                if transport is None:
+                    # the next call opens the gateway and tries the host
+                    continue
+                reachable = await asyncio.to_thread(probe_through, transport, ip, int(port),
+                                                    self.settings.connect_timeout)
+            else:
+                reachable = await asyncio.to_thread(probe_host, ip, int(port), self.settings.connect_timeout)
+            if reachable:
+                logger.info(f"Host {host_key} is reachable again, closing circuit")
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+
+    async def probe_loop(self):
+        while True:
+            await asyncio.sleep(self.settings.probe_interval)
+            try:
+                await self.probe_open_hosts()
+            except Exception as e:
+                logger.error(f"Error probing open hosts: {str(e)}")
+
+    @staticmethod
+    def connection_key(ip: str, username: str, port=22, route: Route = ()) -> str:
+        """key of one pooled connection, a host behind gateways is keyed by its route too"""
+        return f"{username}@{SSHConnectionManager.host_key(ip, port, route)}"
+
+    @staticmethod
+    def host_key(ip: str, port=22, route: Route = ()) -> str:
+        """key of one host for its circuit breaker, followed by the connection key of its gateway"""
+        key = f"{ip}:{port}"
+        if route:
+            key += " via " + SSHConnectionManager.connection_key(route[0].ip, route[0].username,
+                                                                 route[0].port, route[1:])
+        return key
+
+    def active_transport(self, connection_key: str) -> Transport | None:
+        """transport of a pooled connection that is still up"""
+        connection = self.connections.get(connection_key)
+        transport = connection.client.get_transport() if connection is not None else None
+        return transport if transport and transport.is_active() else None
 
-    async def get_connection(self, ip: str, username: str, password: str, port=22) -> Connection | None:
-        """create or reuse ssh connection"""
-        connection_key = f"{username}@{ip}"
+    async def get_connection(self, ip: str, username: str, password: str, port=22,
+                             route: Route = ()) -> Connection | None:
+        """
+        create or reuse ssh connection
+
+        A host behind gateways gets a direct-tcpip channel over the pooled connection of
+        the nearest gateway, which is opened the same way through the rest of the route.
+        """
+        connection_key = self.connection_key(ip, username, port, route)
+
+        # fail fast while the host is known to be down
+        breaker = self.breaker(ip, port, route)
+        if not breaker.allow():
+            raise ssh_circuit_open_exception
 
         # if connection doesn't have a lock, create a lock
         if connection_key not in self.locks:
@@ -60,36 +225,67 @@ class SSHConnectionManager:
                     raise ssh_lock_exception
                     
 
-            # create a new connecting
-            try:
-                logger.info(f"Creating new SSH connection to {connection_key}")
-                connection = Connection(
-                    host=ip,
-                    user=username,
-                    port=port,
-                    connect_kwargs={
-                        "password": password,
-                        "look_for_keys": False,
-                    },
-                    connect_timeout=5
-                )
-                connection.config.run.env = {
-                    'LANG': 'en_US.UTF-8',
-                    'LC_ALL': 'en_US.UTF-8',
-                    'LANGUAGE': 'en_US'
-                }
-                # test connect
-                connection.run("echo 'Testing connection'", hide=True)
-                self.connections[connection_key] = connection
-                return connection
+            # open the gateway first, its handshake takes a slot of its own, its key is
+            # shorter than ours so the locks held on the way can't form a loop
+            jump = None
+            if route:
+                jump = await self.get_connection(route[0].ip, route[0].username, route[0].password,
+                                                 route[0].port, route[1:])
 
-            except Exception as e:
-                logger.error(f"Failed to create new SSH connection to {connection_key}: {str(e)}")
-                raise ssh_create_exception
+            # create a new connecting, the handshake takes an admission slot
+            async with self.admission.slot():
+                # the handshake has to fit in the request deadline
+                connect_timeout = bounded(self.settings.connect_timeout)
+                try:
+                    logger.info(f"Creating new SSH connection to {connection_key}, "
+                                f"transport profile {host_profile(self.settings, ip, port) or 'default'}")
+                    connection = Connection(
+                        host=ip,
+                        user=username,
+                        port=port,
+                        connect_kwargs={
+                            "password": password,
+                            "look_for_keys": False,
+                            # compression, algorithms, window sizes and keepalive of the host
+                            **transport_kwargs(self.settings, ip, port),
+                        },
+                        connect_timeout=connect_timeout,
+                        gateway=jump
+                    )
+                    connection.config.run.env = {
+                        'LANG': 'en_US.UTF-8',
+                        'LC_ALL': 'en_US.UTF-8',
+                        'LANGUAGE': 'en_US'
+                    }
+                    # keep only head and tail of command output in memory
+                    connection.config.runners.remote = BoundedRemote
+                    # invoke takes a timeout of 0 for none, a spent deadline must not become one
+                    if expired():
+                        raise deadline_exception
+                    # test connect, blocking io runs in a worker thread
+                    await asyncio.to_thread(connection.run, "echo 'Testing connection'", hide=True,
+                                            timeout=bounded(None))
+                    # a later reopen is not bound to this request
+                    connection.connect_timeout = self.settings.connect_timeout
+                    if connection_key in self.connections:
+                        self.reconnects[connection_key] = self.reconnects.get(connection_key, 0) + 1
+                    self.connections[connection_key] = connection
+                    breaker.record_success()
+                    return connection
+
+                except Exception as e:
+                    logger.error(f"Failed to create new SSH connection to {connection_key}: {str(e)}")
+                    # running out of request time says nothing about the host either
+                    if expired():
+                        raise deadline_exception
+                    # a wrong password says nothing about the host
+                    if not isinstance(e, AuthenticationException):
+                        breaker.record_failure()
+                    raise ssh_create_exception
 
-    async def close_connection(self, ip: str, username: str, port=22):
+    async def close_connection(self, ip: str, username: str, port=22, route: Route = ()):
         """close specific SSH connection"""
-        connection_key = f"{username}@{ip} -p {port}"
+        connection_key = self.connection_key(ip, username, port, route)
         if connection_key in self.connections:
             try:
                 self.connections[connection_key].close()
@@ -110,38 +306,88 @@ class SSHConnectionManager:
         self.connections.clear()
 
 
-# create one ssh_manager
-ssh_manager = SSHConnectionManager()
+# create one ssh_manager, on first use
+SSH_MANAGER: SSHConnectionManager | None = None
+
+
+def get_ssh_manager() -> SSHConnectionManager:
+    global SSH_MANAGER
+    if SSH_MANAGER is None:
+        SSH_MANAGER = SSHConnectionManager(get_config().ssh)
+    return SSH_MANAGER
 
 
 # dep function
-async def get_ssh_connection(ip: str, username: str, password: str, port=22) -> Connection:
-    return await ssh_manager.get_connection(ip, username, password, port)
+async def get_ssh_connection(ip: str, username: str, password: str, port=22, route: Route = ()) -> Connection:
+    return await get_ssh_manager().get_connection(ip, username, password, port, route)
 
 
 # batch to run execute_commands
-async def execute_commands(connection: Connection, commands: Dict[str, str], in_stream=None) -> Dict[str, Result]:
+async def execute_commands(connection: Connection, commands: Dict[str, str], in_stream=None,
+                           output: Dict[str, int] | None = None,
+                           watchers: List[StreamWatcher] | None = None,
+                           timeouts: Dict[str, float] | None = None) -> Dict[str, Result]:
     """
     Args:
         :param connection: SSH connection
         :param commands: command dicts,{name: commands str}
-        :param in_stream:
+        :param in_stream: stdin of the commands, nothing by default
+        :param output: characters of output kept per command name, ssh settings otherwise
+        :param watchers: invoke stream watchers answering prompts, e.g. the sudo password
+        :param timeouts: seconds per command name, ssh.command_timeout otherwise
     Returns:
-        Dict[str, str]: results
+        Dict[str, str]: results, commands not started before the request deadline are
+            failed results with the reason in stderr
+    Raises:
+        HTTPException: 503 when the admission queue sheds the work
     """
     results = {}
+    manager = get_ssh_manager()
 
     for name, cmd in commands.items():
-        result = empty_result
+        result = SimpleNamespace(**{**vars(empty_result), "command": cmd})
+        start = time.perf_counter()
         try:
-            result = connection.run(cmd,
-                                    in_stream=in_stream,
-                                    hide=True,
-                                    warn=True,
-                                    timeout=10)
-        except Exception as e:
-            logger.error(f"Error executing command: {name}: {str(e)}")
+            if expired():
+                # out of request time, the commands left are not started
+                raise deadline_exception
+            # every command takes an admission slot, higher priority work gets in between
+            async with manager.admission.slot():
+                start = time.perf_counter()
+                limits = manager.output_limits
+                if output and name in output:
+                    limits = limits.retained(output[name])
+                # a command killed by its timeout has its channel closed
+                timeout = bounded((timeouts or {}).get(name, manager.settings.command_timeout))
+                if timeout is not None and timeout <= 0:
+                    # invoke reads a zero timeout as none
+                    raise deadline_exception
+                # invoke mirrors the stdin of this process otherwise and closes the remote stdin at
+                # its end, a command answering prompts must keep it open
+                stdin = in_stream if in_stream is not None else False if watchers else io.StringIO()
+                # the worker thread runs in a copy of this context
+                token = output_limits.set(limits)
+                try:
+                    # fabric is blocking, keep the event loop free for other hosts
+                    result = await asyncio.to_thread(connection.run,
+                                                     cmd,
+                                                     in_stream=stdin,
+                                                     watchers=watchers or [],
+                                                     hide=True,
+                                                     warn=True,
+                                                     timeout=timeout)
+                except Exception as e:
+                    logger.error(f"Error executing command: {name}: {str(e)}")
+                    # timeouts and rejected watcher answers say why the command failed
+                    result.stderr = str(e)
+                finally:
+                    output_limits.reset(token)
+        except HTTPException as e:
+            if not is_deadline(e):
+                raise
+            result.stderr = e.detail
 
+        result.duration = round(time.perf_counter() - start, 3)
         results[name] = result
     return results
 
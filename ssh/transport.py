@@ -0,0 +1,65 @@
+"""SSH transport profiles.
+
+Remote sites on slow, high-latency links want other transport settings than the hosts in
+the machine room: compression, cheaper ciphers, a larger channel window so a big output
+isn't throttled by round trips, and keepalives so idle pooled connections survive
+firewalls. Profiles are named in ssh.transport_profiles and picked per host by the
+patterns in ssh.transport_hosts, hosts matching no pattern get ssh.transport_profile.
+benchmarks/ssh_transport.py compares profiles against a local mock server.
+"""
+
+from fnmatch import fnmatch
+from typing import Any, Callable, Dict, Sequence, Tuple
+from paramiko import Transport
+from paramiko.common import DEFAULT_MAX_PACKET_SIZE, DEFAULT_WINDOW_SIZE
+from models.config_models import SSHSettings, TransportProfile
+
+
+def host_profile(settings: SSHSettings, ip: str, port=22) -> str | None:
+    """name of the transport profile of a host, None for paramiko's defaults"""
+    for pattern, name in settings.transport_hosts.items():
+        if fnmatch(ip, pattern) or fnmatch(f"{ip}:{port}", pattern):
+            return name
+    return settings.transport_profile
+
+
+def preferred(names: Sequence[str], defaults: Sequence[str]) -> Tuple[str, ...]:
+    """the names paramiko knows first, in the given order, then the rest of the defaults"""
+    first = [name for name in names if name in defaults]
+    return tuple(first + [name for name in defaults if name not in first])
+
+
+def transport_factory(profile: TransportProfile) -> Callable[..., Transport]:
+    """paramiko transport_factory building the transport of a profile"""
+
+    def factory(sock, **kwargs) -> Transport:
+        transport = Transport(sock,
+                              default_window_size=profile.window_size or DEFAULT_WINDOW_SIZE,
+                              default_max_packet_size=profile.max_packet_size or DEFAULT_MAX_PACKET_SIZE,
+                              **kwargs)
+        # other algorithms stay allowed, a server without the preferred ones still connects
+        options = transport.get_security_options()
+        if profile.ciphers:
+            options.ciphers = preferred(profile.ciphers, options.ciphers)
+        if profile.kex:
+            options.kex = preferred(profile.kex, options.kex)
+        if profile.macs:
+            options.digests = preferred(profile.macs, options.digests)
+        if profile.keepalive:
+            transport.set_keepalive(profile.keepalive)
+        return transport
+
+    return factory
+
+
+def profile_kwargs(profile: TransportProfile | None) -> Dict[str, Any]:
+    """connect_kwargs of fabric applying a profile"""
+    if profile is None:
+        return {}
+    return {"compress": profile.compress, "transport_factory": transport_factory(profile)}
+
+
+def transport_kwargs(settings: SSHSettings, ip: str, port=22) -> Dict[str, Any]:
+    """connect_kwargs of fabric applying the profile of a host"""
+    name = host_profile(settings, ip, port)
+    return profile_kwargs(settings.transport_profiles[name] if name else None)
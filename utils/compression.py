@@ -0,0 +1,100 @@
+"""Response compression negotiated by Accept-Encoding.
+
+brotli is used when the client accepts it and the brotli package is installed,
+otherwise gzip. Streamed bodies (NDJSON) are flushed chunk by chunk so that every
+line still reaches the client as soon as it is produced.
+"""
+
+from typing import Callable, Dict
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipResponder, IdentityResponder
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+
+def accepted_encodings(header: str) -> set:
+    """encodings of an Accept-Encoding header, without the ones refused with q=0"""
+    encodings = set()
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if name:
+            encodings.add(name.strip().lower())
+    return encodings
+
+
+class FlushingGZipResponder(GZipResponder):
+    """gzip, flushed after every streamed chunk"""
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        self.gzip_file.write(body)
+        if more_body:
+            self.gzip_file.flush()
+        else:
+            self.gzip_file.close()
+
+        body = self.gzip_buffer.getvalue()
+        self.gzip_buffer.seek(0)
+        self.gzip_buffer.truncate()
+        return body
+
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int, quality: int = 4) -> None:
+        super().__init__(app, minimum_size)
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        data = self.compressor.process(body)
+        return data + (self.compressor.flush() if more_body else self.compressor.finish())
+
+
+class CompressionMiddleware:
+    """
+    Compress responses larger than minimum_size with brotli or gzip.
+
+    Args:
+        app: ASGI application
+        minimum_size: Smaller responses are sent as they are
+        gzip_level: gzip compression level
+        brotli_quality: brotli quality, lower is faster
+        settings: Returns the options above, called on the first request for settings loaded at startup
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4,
+                 settings: Callable[[], Dict[str, int]] | None = None) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.settings = settings
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if self.settings is not None:
+            for name, value in self.settings().items():
+                setattr(self, name, value)
+            self.settings = None
+
+        encodings = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        if brotli is not None and "br" in encodings:
+            responder = BrotliResponder(self.app, self.minimum_size, self.brotli_quality)
+        elif "gzip" in encodings:
+            responder = FlushingGZipResponder(self.app, self.minimum_size, compresslevel=self.gzip_level)
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size)
+        await responder(scope, receive, send)
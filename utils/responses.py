@@ -0,0 +1,35 @@
+"""Fast JSON responses for large payloads."""
+
+from typing import Any
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+
+class ModelResponse(ORJSONResponse):
+    """json response rendering pydantic models with their own serializer, anything else with orjson"""
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, BaseModel):
+            return content.model_dump_json().encode("utf-8")
+        return super().render(content)
+
+
+def model_response(content: Any, response: Response | None = None) -> Response:
+    """
+    Wrap an endpoint result in a ModelResponse.
+
+    FastAPI runs a returned model through jsonable_encoder, which costs far more than
+    the serialization itself on big lists. Returning a response skips that step.
+
+    Args:
+        content: Endpoint result, responses (streams, 304) are passed through
+        response: Response of the request, its headers (e.g. ETag) are kept
+
+    Returns:
+        Response: the rendered response
+    """
+    if isinstance(content, Response):
+        return content
+    headers = dict(response.headers) if response is not None else None
+    return ModelResponse(content, headers=headers)
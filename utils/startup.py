@@ -0,0 +1,40 @@
+"""Startup timing of the api process.
+
+Nothing is set up at import time, main.lifespan runs every phase in a fixed order
+inside StartupReport.phase and logs the durations together with the time spent
+importing the application.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+
+class StartupReport:
+    """durations of the startup phases, in the order they ran"""
+
+    def __init__(self, import_time: float):
+        self.import_time = import_time
+        self.phases: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - start
+
+    @property
+    def total(self) -> float:
+        return self.import_time + sum(self.phases.values())
+
+    def timings(self) -> Dict[str, float]:
+        """seconds per phase, imports first"""
+        return {name: round(duration, 4) for name, duration in {"imports": self.import_time, **self.phases}.items()}
+
+    def summary(self) -> str:
+        lines = [f"Startup finished in {self.total * 1000:.0f} ms",
+                 f"{'imports':<12}{self.import_time * 1000:>8.1f} ms"]
+        lines += [f"{name:<12}{duration * 1000:>8.1f} ms" for name, duration in self.phases.items()]
+        return "\n".join(lines)